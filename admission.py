@@ -0,0 +1,200 @@
+import threading
+import time
+from collections import OrderedDict
+
+import grpc
+
+# token buckets kept, the least recently seen clients are forgotten first
+MAX_TRACKED_CLIENTS = 100000
+
+
+class TokenBucket:
+    """rate tokens a second up to burst; a request takes one."""
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+def client_of(request, context):
+    # the address the client names itself by, or where the call comes from (without the port)
+    client = getattr(request, 'ip_port', '') or getattr(request, 'buyer_ip_port', '')
+    if client:
+        return client
+    return context.peer().rsplit(':', 1)[0]
+
+
+class AdmissionControl:
+    """
+    Decides whether a request runs: each client gets a token bucket of rate requests a
+    second (0 for no limit) and each method in method_limits may only have that many
+    requests running at once. Refused requests fail with RESOURCE_EXHAUSTED.
+
+    The decision needs the request, so it is made once a worker picks the request up:
+    on the threaded server a flood still queues ahead of other requests and each refusal
+    takes a worker briefly. Bound the queue with max_concurrent_rpcs (see serve in
+    marketplace.py), which refuses before the pool, and give slow methods their own lane.
+    """
+
+    def __init__(self, rate=0, burst=None, method_limits=None, max_clients=MAX_TRACKED_CLIENTS):
+        self.rate = rate
+        self.burst = burst or max(1, rate)
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self._limits = dict(method_limits or ())
+        self._running = {method: 0 for method in self._limits}
+        self.rejected = 0
+
+    def _take_token(self, client):
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = TokenBucket(self.rate, self.burst)
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+            return bucket.take(time.monotonic())
+
+    def admit(self, method, request, context):
+        """None when the request may run, release(method) must follow then. Otherwise the reason it may not."""
+        if self.rate and not self._take_token(client_of(request, context)):
+            return 'client rate limit exceeded'
+        limit = self._limits.get(method)
+        if limit is not None:
+            with self._lock:
+                if self._running[method] >= limit:
+                    return f'too many concurrent {method} requests'
+                self._running[method] += 1
+        return None
+
+    def release(self, method):
+        if method in self._limits:
+            with self._lock:
+                self._running[method] -= 1
+
+    def refused(self, reason):
+        with self._lock:
+            self.rejected += 1
+        return f'{reason}, retry later'
+
+
+def _method_name(handler_call_details):
+    return handler_call_details.method.rsplit('/', 1)[-1]
+
+
+def _admitted(handler, method, admission):
+    if handler.unary_unary is not None:
+        behavior = handler.unary_unary
+
+        def unary_unary(request, context):
+            reason = admission.admit(method, request, context)
+            if reason is not None:
+                context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, admission.refused(reason))
+            try:
+                return behavior(request, context)
+            finally:
+                admission.release(method)
+
+        return grpc.unary_unary_rpc_method_handler(
+            unary_unary, handler.request_deserializer, handler.response_serializer)
+
+    if handler.unary_stream is not None:
+        behavior = handler.unary_stream
+
+        def unary_stream(request, context):
+            # a stream counts against its method's limit until it ends
+            reason = admission.admit(method, request, context)
+            if reason is not None:
+                context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, admission.refused(reason))
+            try:
+                yield from behavior(request, context)
+            finally:
+                admission.release(method)
+
+        return grpc.unary_stream_rpc_method_handler(
+            unary_stream, handler.request_deserializer, handler.response_serializer)
+
+    return handler
+
+
+def _admitted_aio(handler, method, admission):
+    if handler.unary_unary is not None:
+        behavior = handler.unary_unary
+
+        async def unary_unary(request, context):
+            reason = admission.admit(method, request, context)
+            if reason is not None:
+                await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, admission.refused(reason))
+            try:
+                return await behavior(request, context)
+            finally:
+                admission.release(method)
+
+        return grpc.unary_unary_rpc_method_handler(
+            unary_unary, handler.request_deserializer, handler.response_serializer)
+
+    if handler.unary_stream is not None:
+        behavior = handler.unary_stream
+
+        async def unary_stream(request, context):
+            reason = admission.admit(method, request, context)
+            if reason is not None:
+                await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, admission.refused(reason))
+            try:
+                async for response in behavior(request, context):
+                    yield response
+            finally:
+                admission.release(method)
+
+        return grpc.unary_stream_rpc_method_handler(
+            unary_stream, handler.request_deserializer, handler.response_serializer)
+
+    return handler
+
+
+class AdmissionInterceptor(grpc.ServerInterceptor):
+    """Applies an AdmissionControl to every RPC of a grpc.server."""
+
+    def __init__(self, admission):
+        self.admission = admission
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        return _admitted(handler, _method_name(handler_call_details), self.admission)
+
+
+class AsyncAdmissionInterceptor(grpc.aio.ServerInterceptor):
+    """AdmissionInterceptor for grpc.aio servers."""
+
+    def __init__(self, admission):
+        self.admission = admission
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        return _admitted_aio(handler, _method_name(handler_call_details), self.admission)
+
+
+def parse_method_limits(entries):
+    """['SearchItem=4', ...] as given on the command line, to {'SearchItem': 4, ...}."""
+    limits = dict()
+    for entry in entries or ():
+        method, _, limit = entry.partition('=')
+        limits[method] = int(limit)
+    return limits
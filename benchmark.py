@@ -0,0 +1,238 @@
+"""
+Load generator for the marketplace.
+
+    python benchmark.py --catalog-size 100000 --clients 32 --duration 30
+    python benchmark.py --target localhost:50051 --mix search=80,buy=20
+
+Without --target a MarketplaceService is started in this process and served on a free
+localhost port; --direct calls its handlers without gRPC in between. The catalog is
+filled up front, then every client thread issues RPCs picked at random from the mix
+until the time is up, and throughput and latency percentiles are reported per RPC.
+"""
+import argparse
+import random
+import threading
+import time
+from concurrent import futures
+
+import grpc
+
+from client import MarketplaceClient
+from marketplace import MAX_WORKERS, SERVER_OPTIONS, MarketplaceService
+from models import Seller
+
+import marketplace_pb2
+import marketplace_pb2_grpc
+
+DEFAULT_MIX = 'search=40,search_all=5,buy=20,sell=10,rate=10,wishlist=15'
+CATEGORIES = ('Electronics', 'Fashion', 'Others')
+SELLER = Seller('bench-seller:0', 'bench')
+PRELOAD_BATCH = 10000
+# distinct names in the catalog, each exact name search matches catalog_size / N_NAMES products
+N_NAMES = 1000
+N_BUYERS = 10000
+# clients share channels, one per this many
+CLIENTS_PER_CHANNEL = 8
+
+
+def parse_mix(mix):
+    weights = dict()
+    for entry in mix.split(','):
+        op, _, weight = entry.partition('=')
+        if op not in OPERATIONS:
+            raise ValueError(f'unknown operation {op!r}, pick from {", ".join(OPERATIONS)}')
+        weights[op] = float(weight or 1)
+    return weights
+
+
+def product_name(i):
+    return f'item{i % N_NAMES}'
+
+
+# each operation builds its request from the client's random source and the catalog size
+def sell(rng, catalog_size):
+    i = rng.randrange(catalog_size)
+    return 'SellItem', marketplace_pb2.SellItemRequest(
+        ip_port=SELLER.ip_port, uuid=SELLER.uuid, name=product_name(i), price=rng.uniform(1, 1000),
+        quantity=1000000, description='benchmark item', category=CATEGORIES[i % len(CATEGORIES)])
+
+
+def search(rng, catalog_size):
+    return 'SearchItem', marketplace_pb2.SearchItemRequest(
+        name=product_name(rng.randrange(N_NAMES)), category='all')
+
+
+def search_all(rng, catalog_size):
+    # the full catalog scan, ranked and cut down to one page
+    return 'SearchItem', marketplace_pb2.SearchItemRequest(
+        name='*', category=rng.choice(CATEGORIES), sort_by=marketplace_pb2.PRICE, limit=100)
+
+
+def buy(rng, catalog_size):
+    return 'BuyItem', marketplace_pb2.BuyItemRequest(
+        _id=rng.randrange(1, catalog_size + 1), quantity=1, ip_port=f'bench-buyer:{rng.randrange(N_BUYERS)}')
+
+
+def rate(rng, catalog_size):
+    return 'RateItem', marketplace_pb2.RateItemRequest(
+        _id=rng.randrange(1, catalog_size + 1), buyer_ip_port=f'bench-buyer:{rng.randrange(N_BUYERS)}',
+        rating=rng.randint(1, 5))
+
+
+def wishlist(rng, catalog_size):
+    return 'WishlistItem', marketplace_pb2.WishlistRequest(
+        _id=rng.randrange(1, catalog_size + 1), buyer_ip_port=f'bench-buyer:{rng.randrange(N_BUYERS)}')
+
+
+OPERATIONS = {
+    'sell': sell,
+    'search': search,
+    'search_all': search_all,
+    'buy': buy,
+    'rate': rate,
+    'wishlist': wishlist,
+}
+
+
+def preload(call, catalog_size):
+    """Registers the benchmark seller and lists catalog_size products in batches."""
+    call('RegisterSeller', marketplace_pb2.RegisterSellerRequest(ip_port=SELLER.ip_port, uuid=SELLER.uuid))
+    rng = random.Random(0)
+    for start in range(0, catalog_size, PRELOAD_BATCH):
+        items = [marketplace_pb2.SellItemEntry(
+            name=product_name(i), price=rng.uniform(1, 1000), quantity=1000000,
+            description='benchmark item', category=CATEGORIES[i % len(CATEGORIES)])
+            for i in range(start, min(start + PRELOAD_BATCH, catalog_size))]
+        call('SellItems', marketplace_pb2.SellItemsRequest(ip_port=SELLER.ip_port, uuid=SELLER.uuid, items=items))
+
+
+def newest_id(call):
+    # products are assumed to be numbered 1..newest, as in a catalog nothing was deleted from
+    request = marketplace_pb2.SearchItemStreamRequest(name='*', sort_by=marketplace_pb2.RECENCY, limit=1)
+    for page in call('SearchItemStream', request):
+        if page.products:
+            return page.products[0]._id
+    return 0
+
+
+class Client(threading.Thread):
+    def __init__(self, index, call, weights, catalog_size, deadline):
+        super().__init__(name=f'bench-client-{index}', daemon=True)
+        self.call = call
+        self.operations = [OPERATIONS[op] for op in weights]
+        self.weights = list(weights.values())
+        self.catalog_size = catalog_size
+        self.deadline = deadline
+        self.rng = random.Random(index)
+        self.latencies = dict()  # op -> seconds per call
+        self.failures = dict()  # op -> calls that returned FAIL or raised
+
+    def run(self):
+        while time.perf_counter() < self.deadline:
+            operation = self.rng.choices(self.operations, self.weights)[0]
+            method, request = operation(self.rng, self.catalog_size)
+            started = time.perf_counter()
+            try:
+                failed = getattr(self.call(method, request), 'status', 'SUCCESS') == 'FAIL'
+            except grpc.RpcError:
+                failed = True
+            self.latencies.setdefault(operation.__name__, []).append(time.perf_counter() - started)
+            if failed:
+                self.failures[operation.__name__] = self.failures.get(operation.__name__, 0) + 1
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def report(clients, elapsed):
+    latencies, failures = dict(), dict()
+    for client in clients:
+        for op, values in client.latencies.items():
+            latencies.setdefault(op, []).extend(values)
+        for op, count in client.failures.items():
+            failures[op] = failures.get(op, 0) + count
+
+    print(f"{'rpc':<12}{'calls':>10}{'failed':>8}{'per sec':>11}{'p50 ms':>10}{'p99 ms':>10}")
+    total = 0
+    for op in sorted(latencies):
+        values = sorted(latencies[op])
+        total += len(values)
+        print(f'{op:<12}{len(values):>10}{failures.get(op, 0):>8}{len(values) / elapsed:>11.1f}'
+              f'{percentile(values, 0.5) * 1000:>10.3f}{percentile(values, 0.99) * 1000:>10.3f}')
+    print(f"{'total':<12}{total:>10}{sum(failures.values()):>8}{total / elapsed:>11.1f}")
+
+
+def start_server(service, max_workers):
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers), options=SERVER_OPTIONS)
+    marketplace_pb2_grpc.add_MarketplaceServicer_to_server(service, server)
+    port = server.add_insecure_port('localhost:0')
+    server.start()
+    return server, f'localhost:{port}'
+
+
+def grpc_caller(client):
+    def call(method, request):
+        return getattr(client, method)(request)
+    return call
+
+
+def direct_caller(service):
+    def call(method, request):
+        return getattr(service, method)(request, None)
+    return call
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SaharaOSP marketplace load generator')
+    parser.add_argument('--target', help='host:port of a running marketplace, otherwise one is started here')
+    parser.add_argument('--direct', action='store_true',
+                        help='call the in-process service handlers directly, without gRPC')
+    parser.add_argument('--max-workers', type=int, default=MAX_WORKERS, help='workers of the in-process server')
+    parser.add_argument('--catalog-size', type=int, default=10000,
+                        help='products listed before the run, 0 to use the target catalog as it is')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10, help='seconds')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='operation=weight,... out of ' + ', '.join(OPERATIONS))
+    args = parser.parse_args()
+    weights = parse_mix(args.mix)
+    if args.direct and args.target:
+        parser.error('--direct only works with the in-process service')
+
+    server = None
+    if args.target is None:
+        service = MarketplaceService()
+        if not args.direct:
+            server, args.target = start_server(service, args.max_workers)
+
+    if args.direct:
+        callers = [direct_caller(service)] * args.clients
+    else:
+        client = MarketplaceClient(args.target, pool_size=max(1, args.clients // CLIENTS_PER_CHANNEL))
+        callers = [grpc_caller(client)] * args.clients
+
+    catalog_size = args.catalog_size
+    if catalog_size:
+        started = time.perf_counter()
+        preload(callers[0], catalog_size)
+        print(f'Listed {catalog_size} products in {time.perf_counter() - started:.1f}s')
+    else:
+        catalog_size = newest_id(callers[0])
+        if not catalog_size:
+            parser.error('the catalog is empty, fill it with --catalog-size')
+
+    deadline = time.perf_counter() + args.duration
+    clients = [Client(i, callers[i], weights, catalog_size, deadline) for i in range(args.clients)]
+    started = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    report(clients, time.perf_counter() - started)
+
+    if server is not None:
+        server.stop(None)
+
+
+if __name__ == '__main__':
+    main()
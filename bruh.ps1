@@ -1,2 +1,2 @@
-pip install grpcio-tools
+pip install grpcio-tools numpy
 python -m grpc_tools.protoc -I=protos/ --python_out=. --grpc_python_out=. .\protos\marketplace.proto
\ No newline at end of file
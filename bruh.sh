@@ -3,5 +3,5 @@ pip install --upgrade pip
 python3 -m venv venv
 source venv/bin/activate
 
-pip install grpcio grpcio-tools
+pip install grpcio grpcio-tools numpy
 python -m grpc_tools.protoc -I=protos/ --python_out=. --grpc_python_out=. ./protos/marketplace.proto
\ No newline at end of file
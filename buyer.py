@@ -1,26 +1,32 @@
 import threading
-from concurrent import futures
 
 import grpc
 import uuid
 
 import marketplace_pb2
-import marketplace_pb2_grpc
+from client import MarketplaceClient
 
 
-class BuyerNotificationServicer(marketplace_pb2_grpc.notificationServicer):
-    def SendNotification(self, request, context):
-        print("\nReceived a notification: ", request.message)
-        return marketplace_pb2.NotificationResponse(response="Received a notification")
+def listen_for_notifications():
+    # notifications come back over the marketplace channel, no inbound port needed
+    subscription = stub.Subscribe(marketplace_pb2.SubscribeRequest(ip_port=ip_port))
+    print("Listening for updates on your wishlist...")
+    try:
+        for notification in subscription:
+            print("\nReceived a notification: ", notification.message)
+    except grpc.RpcError as error:
+        if error.code() == grpc.StatusCode.RESOURCE_EXHAUSTED:
+            print("\nThe marketplace takes no more subscribers right now, no notifications this session")
+        else:
+            print("\nStopped receiving notifications: ", error.code())
 
 
-def run_notif_server():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    marketplace_pb2_grpc.add_notificationServicer_to_server(BuyerNotificationServicer(), server)
-    server.add_insecure_port("[::]:50053")
-    server.start()
-    print("Listening for updates on your wishlist...")
-    server.wait_for_termination()
+def start_listening():
+    # only once there is something to be notified about, every stream holds on to a server thread
+    global notif_thread
+    if notif_thread is None:
+        notif_thread = threading.Thread(target=listen_for_notifications, daemon=True)
+        notif_thread.start()
 
 
 menu = """
@@ -31,6 +37,8 @@ menu = """
 5) Exit SaharaOSP
 """
 welcome = "Welcome to SaharaOSP.py!"
+BUY_ATTEMPTS = 3
+BUY_TIMEOUT = 5
 
 
 def get_category_input():
@@ -46,19 +54,51 @@ Enter the number of the category of the product you wish to search for:
         return 'Electronics'
     elif _category == "2":
         return 'Fashion'
+    elif _category == "4":
+        return 'all'
     else:
         return 'Others'
 
 
+def get_match_input():
+    choices = """
+How should the name match?
+1) Exact name
+2) Name starts with
+3) Name contains
+"""
+    _match = input(choices)
+    if _match == "2":
+        return marketplace_pb2.PREFIX
+    elif _match == "3":
+        return marketplace_pb2.SUBSTRING
+    else:
+        return marketplace_pb2.EXACT
+
+
+def get_filters_input():
+    filters = marketplace_pb2.SearchFilters()
+    min_price = input('Minimum price (leave empty for any): ')
+    if min_price:
+        filters.min_price = float(min_price)
+    max_price = input('Maximum price (leave empty for any): ')
+    if max_price:
+        filters.max_price = float(max_price)
+    min_rating = input('Minimum rating (leave empty for any): ')
+    if min_rating:
+        filters.min_rating = float(min_rating)
+    filters.in_stock = input('Only items in stock? (y/n): ') == 'y'
+    return filters
+
+
 ip_port = "127.0.0.1:50053"
-channel = grpc.insecure_channel('localhost:50051')
-stub = marketplace_pb2_grpc.MarketplaceStub(channel)
+# one connection with keepalive, see client.py
+stub = MarketplaceClient('localhost:50051', pool_size=1)
 
 print("You are connecting from {}".format(ip_port))
 print(welcome)
 
-# notif_server_thread = threading.Thread(target=run_notif_server)
-# notif_server_thread.start()
+notif_thread = None
 
 while True:
     print(menu)
@@ -66,9 +106,18 @@ while True:
     if choice == '1':
         name = input('Enter the name of the item (write * to get all items): ')
         category = get_category_input()
-        response = stub.SearchItem(marketplace_pb2.SearchItemRequest(name=name, category=category))
-        print(response.status)
-        print(response.message)
+        match = get_match_input() if name != '*' else marketplace_pb2.EXACT
+        filters = get_filters_input()
+        pages = stub.SearchItemStream(marketplace_pb2.SearchItemStreamRequest(name=name, category=category,
+                                                                              match=match, filters=filters))
+        for page in pages:
+            for product in page.products:
+                print("Id={}\nName={}\nPrice={}\nQuantity={}\nCategory={}\nDescription={}\n"
+                      "Seller ip:port={}\nRating={}\n".format(product._id, product.name, product.price,
+                                                              product.quantity, product.category,
+                                                              product.description, product.seller_ip_port,
+                                                              product.rating))
+        print(page.status)
     elif choice == '2':
         id_of_item = int(input('Enter the id of item you want to rate: '))
         rating = int(input("Enter your rating: "))
@@ -82,12 +131,24 @@ while True:
             marketplace_pb2.WishlistRequest(buyer_ip_port=ip_port, _id=id_of_item))
         print(wishlist_response.status)
         print(wishlist_response.message)
+        if wishlist_response.status == "SUCCESS":
+            start_listening()
     elif choice == '4':
         id_of_item = int(input('Enter the id of item you want to buy: '))
         quantity = int(input("Enter quantity: "))
-        response = stub.BuyItem(marketplace_pb2.BuyItemRequest(
-            _id=id_of_item, quantity=quantity, ip_port=ip_port))
-        print(response.status)
+        # retries reuse the request id, so a purchase that went through before a timeout isn't made twice
+        request = marketplace_pb2.BuyItemRequest(
+            _id=id_of_item, quantity=quantity, ip_port=ip_port, request_id=str(uuid.uuid4()))
+        for attempt in range(BUY_ATTEMPTS):
+            try:
+                response = stub.BuyItem(request, timeout=BUY_TIMEOUT)
+                print(response.status)
+                break
+            except grpc.RpcError as error:
+                if error.code() not in (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED) \
+                        or attempt == BUY_ATTEMPTS - 1:
+                    print("Could not buy the item: ", error.code())
+                    break
     elif choice == '5':
         break
     else:
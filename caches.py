@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
+
+GENERATION_STRIPES = 256
+
+
+class TextCache:
+    """
+    Rendered text by key, for output that is rebuilt far more often than what it shows
+    changes. Writers call invalidate(key) after changing what key renders.
+
+    A reader that rendered a value while its key was invalidated must not store it, it
+    may show the old data. Each key maps onto one of a fixed number of generation
+    counters, bumped by every invalidation; a value is only stored if the counter
+    didn't move while it was rendered. Past max_entries the oldest entries are dropped.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._values = dict()
+        self._generations = [0] * GENERATION_STRIPES
+
+    def generation(self, key):
+        return self._generations[hash(key) % GENERATION_STRIPES]
+
+    def lookup(self, key):
+        return self._values.get(key)
+
+    def store(self, key, value, generation):
+        """Stores value, rendered after generation(key) returned generation, unless key was invalidated since."""
+        with self._lock:
+            if self._generations[hash(key) % GENERATION_STRIPES] != generation:
+                return
+            self._values[key] = value
+            if self.max_entries is not None and len(self._values) > self.max_entries:
+                # dicts keep insertion order, the first key is the oldest
+                del self._values[next(iter(self._values))]
+
+    def get(self, key, render):
+        value = self._values.get(key)
+        if value is None:
+            generation = self.generation(key)
+            value = render()
+            self.store(key, value, generation)
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generations[hash(key) % GENERATION_STRIPES] += 1
+            self._values.pop(key, None)
+
+    def __len__(self):
+        return len(self._values)
+
+
+class SearchCache:
+    """
+    Search results by query, least recently used dropped first and none kept longer than
+    ttl seconds. Every mutation that can change a result calls bump(), which moves the
+    catalog version on and so invalidates all entries at once: an entry is only served
+    at the version it was computed at.
+    """
+
+    def __init__(self, max_entries=10000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (version, expiry, result)
+
+    def bump(self):
+        with self._lock:
+            self.version += 1
+
+    def get(self, key, compute):
+        version = self.version
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        result = compute()
+        with self._lock:
+            # not if the catalog changed while it was computed
+            if self.version == version:
+                self._entries[key] = (version, time.monotonic() + self.ttl, result)
+                self._entries.move_to_end(key)
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return result
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,144 @@
+"""
+Client library for the marketplace.
+
+    client = MarketplaceClient('localhost:50051')
+    client.SellItem(marketplace_pb2.SellItemRequest(...))           # blocking
+    future = client.BuyItem.future(marketplace_pb2.BuyItemRequest(...))
+    for response in client.pipeline(('SearchItem', request) for request in requests):
+        ...
+
+    async with AsyncMarketplaceClient('localhost:50051') as client:
+        responses = await client.gather(('SearchItem', request) for request in requests)
+
+Every RPC of MarketplaceStub is available under its own name, calls are spread over a
+small pool of channels with their own connections.
+"""
+import asyncio
+import collections
+import itertools
+import threading
+
+import grpc
+
+import marketplace_pb2_grpc
+
+POOL_SIZE = 4
+MAX_IN_FLIGHT = 256
+# ping idle connections so dead ones are noticed before a call is sent on them,
+# see SERVER_OPTIONS in marketplace.py for what the server accepts
+KEEPALIVE_TIME_MS = 30000
+KEEPALIVE_TIMEOUT_MS = 10000
+MAX_MESSAGE_LENGTH = 64 * 1024 * 1024
+
+CHANNEL_OPTIONS = [
+    ('grpc.keepalive_time_ms', KEEPALIVE_TIME_MS),
+    ('grpc.keepalive_timeout_ms', KEEPALIVE_TIMEOUT_MS),
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.max_pings_without_data', 0),
+    ('grpc.max_send_message_length', MAX_MESSAGE_LENGTH),
+    ('grpc.max_receive_message_length', MAX_MESSAGE_LENGTH),
+    # without it channels to the same target share one connection
+    ('grpc.use_local_subchannel_pool', 1),
+]
+
+
+class MarketplaceClient:
+    """A pool of channels to one marketplace, used round robin."""
+
+    def __init__(self, target='localhost:50051', pool_size=POOL_SIZE, options=()):
+        options = CHANNEL_OPTIONS + list(options)
+        self.channels = [grpc.insecure_channel(target, options=options) for _ in range(pool_size)]
+        self._stubs = [marketplace_pb2_grpc.MarketplaceStub(channel) for channel in self.channels]
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def stub(self):
+        with self._lock:
+            return self._stubs[next(self._next) % len(self._stubs)]
+
+    def __getattr__(self, method):
+        # client.BuyItem(...), client.BuyItem.future(...), client.Subscribe(...)
+        return getattr(self.stub(), method)
+
+    def pipeline(self, calls, max_in_flight=MAX_IN_FLIGHT, timeout=None):
+        """
+        Issues (method, request) calls without waiting for each response, keeping up to
+        max_in_flight outstanding. Yields the responses in the order of calls, or the
+        grpc.RpcError of the calls that failed.
+        """
+        in_flight = collections.deque()
+        for method, request in calls:
+            if len(in_flight) >= max_in_flight:
+                yield _result(in_flight.popleft())
+            in_flight.append(getattr(self.stub(), method).future(request, timeout=timeout))
+        while in_flight:
+            yield _result(in_flight.popleft())
+
+    def wait_ready(self, timeout=None):
+        for channel in self.channels:
+            grpc.channel_ready_future(channel).result(timeout=timeout)
+
+    def close(self):
+        for channel in self.channels:
+            channel.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _result(future):
+    try:
+        return future.result()
+    except grpc.RpcError as error:
+        return error
+
+
+class AsyncMarketplaceClient:
+    """MarketplaceClient for asyncio code, over grpc.aio channels."""
+
+    def __init__(self, target='localhost:50051', pool_size=POOL_SIZE, options=()):
+        options = CHANNEL_OPTIONS + list(options)
+        self.channels = [grpc.aio.insecure_channel(target, options=options) for _ in range(pool_size)]
+        self._stubs = [marketplace_pb2_grpc.MarketplaceStub(channel) for channel in self.channels]
+        self._next = itertools.count()
+
+    def stub(self):
+        # only used from the event loop, no lock needed
+        return self._stubs[next(self._next) % len(self._stubs)]
+
+    def __getattr__(self, method):
+        # await client.BuyItem(...), async for page in client.SearchItemStream(...)
+        return getattr(self.stub(), method)
+
+    async def gather(self, calls, max_in_flight=MAX_IN_FLIGHT, timeout=None):
+        """
+        Runs (method, request) calls concurrently, up to max_in_flight at a time. Returns the
+        responses in the order of calls, or the grpc.RpcError of the calls that failed.
+        """
+        semaphore = asyncio.Semaphore(max_in_flight)
+
+        async def call(method, request):
+            async with semaphore:
+                try:
+                    return await getattr(self.stub(), method)(request, timeout=timeout)
+                except grpc.RpcError as error:
+                    return error
+
+        return await asyncio.gather(*(call(method, request) for method, request in calls))
+
+    async def wait_ready(self):
+        for channel in self.channels:
+            await channel.channel_ready()
+
+    async def close(self):
+        for channel in self.channels:
+            await channel.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -0,0 +1,141 @@
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+class RWLock:
+    """
+    Many readers or one writer. Waiting writers block new readers so a steady
+    stream of searches cannot starve SellItem/DeleteItem.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        with self._cond:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+
+    def release_write(self):
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class LockStripes:
+    """A fixed pool of locks shared by hashing keys onto it."""
+
+    def __init__(self, n_stripes=64):
+        self._locks = [threading.Lock() for _ in range(n_stripes)]
+
+    def for_key(self, key):
+        return self._locks[hash(key) % len(self._locks)]
+
+
+class IdAllocator:
+    """Hands out start, start + step, start + 2 * step, ... (a step > 1 lets shards share one id space)."""
+
+    def __init__(self, start=1, step=1):
+        self._lock = threading.Lock()
+        self._next = start
+        self.step = step
+
+    def next(self):
+        with self._lock:
+            _id = self._next
+            self._next += self.step
+            return _id
+
+    def peek(self):
+        return self._next
+
+    def advance_to(self, next_id):
+        with self._lock:
+            self._next = max(self._next, next_id)
+
+
+class IdempotencyCache:
+    """
+    Responses of the most recent max_entries requests by idempotency key. run() computes
+    the response of a key once; a retry gets the stored response, and one that arrives
+    while the first attempt is still running waits for it.
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._cond = threading.Condition(threading.Lock())
+        self._responses = OrderedDict()
+        self._running = set()
+
+    def run(self, key, compute):
+        """The response stored for key, or compute() stored under it. Also returns whether it was a retry."""
+        with self._cond:
+            while key in self._running:
+                self._cond.wait()
+            if key in self._responses:
+                self._responses.move_to_end(key)
+                return self._responses[key], True
+            self._running.add(key)
+
+        response = None
+        try:
+            response = compute()
+            return response, False
+        finally:
+            # an attempt that raised is not remembered, it can be retried
+            with self._cond:
+                self._running.discard(key)
+                if response is not None:
+                    self._store(key, response)
+                self._cond.notify_all()
+
+    def remember(self, key, response):
+        """Stores response for key right away, e.g. while still holding the locks its change was made under."""
+        with self._cond:
+            self._store(key, response)
+
+    def _store(self, key, response):
+        self._responses[key] = response
+        self._responses.move_to_end(key)
+        if len(self._responses) > self.max_entries:
+            self._responses.popitem(last=False)
+
+    def items(self):
+        """(key, response) pairs, least recently used first."""
+        with self._cond:
+            return list(self._responses.items())
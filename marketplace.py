@@ -1,266 +1,583 @@
+import argparse
+import bisect
+import itertools
+import logging
+
 import grpc
-from concurrent import futures
-from typing import Dict, Set
+from typing import Dict, Set, Tuple
 
+from admission import AdmissionControl, AdmissionInterceptor, parse_method_limits
+from caches import SearchCache, TextCache
+from concurrency import IdAllocator, IdempotencyCache, LockStripes, RWLock
+from metrics import Metrics, MetricsInterceptor, serve_metrics
 from models import Buyer, Seller, Product
+from notifications import NotificationDispatcher, SubscriptionHub
+from persistence import Persistence
+from product_store import ProductStore
+from scheduling import DEFAULT_LANE, LaneExecutor, LaneInterceptor, parse_lanes, with_stream_lane
+from search_index import NameSearchIndex
+from structured_logging import configure as configure_logging, fields
 
 import marketplace_pb2
 import marketplace_pb2_grpc
 
 
-class MarketClient:
-    def __init__(self, server_address):
-        self.channel = grpc.insecure_channel(server_address)
-        self.stub = marketplace_pb2_grpc.notificationStub(self.channel)
+MAX_WORKERS = 32
+# Subscribe (and Follow) streams held at once by the threaded server, each takes a thread
+# of its own lane; more are refused with RESOURCE_EXHAUSTED, see scheduling.py
+MAX_STREAMS = 256
+SEARCH_PAGE_SIZE = 100
+MAX_SEARCH_PAGE_SIZE = 1000
+# how many rendered seller listings are kept
+SELLER_LISTING_CACHE_SIZE = 10000
+SEARCH_CACHE_SIZE = 10000
+SEARCH_CACHE_TTL = 60
+
+# let clients keep idle connections alive with pings, see CHANNEL_OPTIONS in client.py
+SERVER_OPTIONS = [
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.http2.min_ping_interval_without_data_ms', 10000),
+    ('grpc.http2.max_pings_without_data', 0),
+    ('grpc.max_send_message_length', 64 * 1024 * 1024),
+    ('grpc.max_receive_message_length', 64 * 1024 * 1024),
+]
+
+# requests are logged at DEBUG, their outcome at INFO, see structured_logging.py
+logger = logging.getLogger('marketplace.service')
+
+
+# ProductStore column each sort key orders by
+SORT_COLUMNS = {
+    marketplace_pb2.PRICE: 'prices',
+    marketplace_pb2.RATING: 'ratings',
+    marketplace_pb2.N_RATINGS: 'n_ratings',
+    marketplace_pb2.RECENCY: 'ids',
+}
+
+
+def search_bounds(filters):
+    # keyword arguments of ProductStore.select for the filters that are set
+    bounds = dict()
+    if filters is None:
+        return bounds
+    for field in ('min_price', 'max_price', 'min_rating'):
+        if filters.HasField(field):
+            bounds[field] = getattr(filters, field)
+    if filters.in_stock:
+        bounds['in_stock'] = True
+    return bounds
+
+
+def search_error(request):
+    # why a SearchItem/SearchItemStream request can't be served, None when it can
+    if request.limit < 0:
+        return "limit can't be negative"
+    if getattr(request, 'cursor', 0) < 0:
+        return "cursor can't be negative"
+    if getattr(request, 'page_size', 0) < 0:
+        return "page_size can't be negative"
+    return None
+
+
+def product_to_message(product):
+    return marketplace_pb2.Product(
+        _id=product.id,
+        name=product.name,
+        price=product.price,
+        quantity=product.quantity,
+        description=product.description,
+        seller_ip_port=product.seller_ip_port,
+        category=product.category,
+        rating=product.rating,
+        n_ratings=product.n_ratings,
+    )
+
+
+def product_from_message(message):
+    product = Product(message.name, message.price, message.quantity, message.description,
+                      message.seller_ip_port, message._id, message.category)
+    product.rating = message.rating
+    product.n_ratings = message.n_ratings
+    return product
 
-    def notify(self, message):
-        request = marketplace_pb2.NotificationRequest(request=message)
-        response = self.stub.SendNotification(request)
-        print('Response of notification:', response.response)
 
 class MarketplaceService(marketplace_pb2_grpc.MarketplaceServicer):
-    def __init__(self):
+    def __init__(self, notifier=None, id_start=1, id_step=1):
         super().__init__()
-        self.id_index = 1
-        self.product_id_to_product: Dict[int, Product] = dict()
+        self.notifier = notifier
+        self.subscriptions = SubscriptionHub()
+        # write-ahead log the successful mutations are appended to, see persistence.py
+        self.wal = None
+        # the same for replicas, see replication.py
+        self.change_feed = None
+        self.id_start, self.id_step = id_start, id_step
+        self._reset_catalog()
+
+        # the catalog structure (products, sellers, indexes) is guarded by catalog_lock,
+        # taken for writing only when products or sellers come and go.
+        # quantity/rating updates of one product and the per-buyer sets are guarded by striped locks
+        self.catalog_lock = RWLock()
+        self.product_locks = LockStripes()
+        self.buyer_locks = LockStripes()
+
+    def _reset_catalog(self):
+        self.id_allocator = IdAllocator(self.id_start, self.id_step)
+        self.product_id_to_product = ProductStore()
         self.sellers: Dict[Seller, Set[int]] = dict()
         self.wishlist: Dict[Buyer, Set[int]] = dict()
+        # reverse of wishlist, the buyers watching each product
+        self.wishlisted_by: Dict[int, Set[Buyer]] = dict()
         self.rated_items: Dict[Buyer, Set[int]] = dict()
+        # BuyItem responses by (ip_port, request_id), so retried purchases aren't bought twice
+        self.buy_responses = IdempotencyCache()
+
+        # secondary indexes for SearchItem, kept in sync by SellItem/DeleteItem
+        self.name_index: Dict[str, Set[int]] = dict()
+        self.name_category_index: Dict[Tuple[str, str], Set[int]] = dict()
+        self.partial_name_index = NameSearchIndex()
+
+        # the DisplaySellerItems output by seller ip_port,
+        # invalidated by whatever changes one of the seller's products (see _product_changed)
+        self.seller_listings = TextCache(SELLER_LISTING_CACHE_SIZE)
+        # SearchItem responses by request, for the catalog version they were computed at
+        self.search_results = SearchCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+
+    def _notify(self, address, message):
+        # subscribed clients get it on their stream. The others are only dialed back with a
+        # notifier, which serve() sets up for clients known to run a notification server
+        if self.subscriptions.publish(address, message):
+            return
+        if self.notifier is not None:
+            self.notifier.notify(address, message)
+        else:
+            logger.debug("no subscriber, notification dropped", extra=fields(address=address))
+
+    def _log_mutation(self, method, request):
+        # called while still holding the locks of the mutation so the log order is the apply order
+        if self.change_feed is not None:
+            self.change_feed.append(method, request)
+        if self.wal is None:
+            return 0
+        return self.wal.append(method, request)
+
+    def _wait_durable(self, seq):
+        # called after the locks are released so concurrent writers share one fsync
+        if seq:
+            self.wal.wait_durable(seq)
+
+    def state_copy(self):
+        """
+        What dump_state() reads, copied. Cheap to take under the catalog write lock (array,
+        list and set copies), and dumped with dump_state(copy) after it is released.
+        """
+        return (self.id_allocator.peek(), self.product_id_to_product.copy(),
+                {seller: set(ids) for seller, ids in self.sellers.items()},
+                {buyer: set(ids) for buyer, ids in self.wishlist.items()},
+                {buyer: set(ids) for buyer, ids in self.rated_items.items()},
+                self.buy_responses.items())
+
+    def dump_state(self, copy=None):
+        """The state as JSON-able lists, of the service or of a state_copy() of it."""
+        next_id, products, sellers, wishlist, rated_items, buy_responses = copy or (
+            self.id_allocator.peek(), self.product_id_to_product, self.sellers, self.wishlist,
+            self.rated_items, self.buy_responses.items())
+        return {
+            'next_id': next_id,
+            'products': [[product.id, product.name, product.price, product.quantity, product.description,
+                          product.seller_ip_port, product.category, product.rating, product.n_ratings]
+                         for product in products.values()],
+            'sellers': [[seller.ip_port, seller.uuid, sorted(ids)] for seller, ids in sellers.items()],
+            'wishlist': [[buyer.ip_port, sorted(ids)] for buyer, ids in wishlist.items()],
+            'rated_items': [[buyer.ip_port, sorted(ids)] for buyer, ids in rated_items.items()],
+            # so a purchase retried after a restart from this snapshot isn't made again
+            'buy_responses': [[ip_port, request_id, response.status]
+                              for (ip_port, request_id), response in buy_responses],
+        }
+
+    def load_state(self, state):
+        """
+        Replaces everything in the service with a dump_state(). The ids of a seller or buyer
+        may be split over several entries, they are merged.
+        """
+        with self.catalog_lock.write():
+            self._reset_catalog()
+            self.id_allocator.advance_to(state['next_id'])
+            for _id, name, price, quantity, description, seller_ip_port, category, rating, n_ratings \
+                    in state['products']:
+                product = Product(name, price, quantity, description, seller_ip_port, _id, category)
+                product.rating = rating
+                product.n_ratings = n_ratings
+                self.product_id_to_product.add(product)
+                self._index_product(product)
+            for ip_port, uuid, ids in state['sellers']:
+                self.sellers.setdefault(Seller(ip_port, uuid), set()).update(ids)
+            for ip_port, ids in state['wishlist']:
+                buyer = Buyer(ip_port)
+                self.wishlist.setdefault(buyer, set()).update(ids)
+                for product_id in ids:
+                    self.wishlisted_by.setdefault(product_id, set()).add(buyer)
+            for ip_port, ids in state['rated_items']:
+                self.rated_items.setdefault(Buyer(ip_port), set()).update(ids)
+            # not in snapshots written before purchases were idempotent
+            for ip_port, request_id, status in state.get('buy_responses', ()):
+                self.buy_responses.remember((ip_port, request_id), marketplace_pb2.BuyItemResponse(status=status))
+
+    def _add_product(self, seller, item):
+        # the catalog write lock must be held
+        new_product = Product(item.name, item.price, item.quantity,
+                              item.description, seller.ip_port, self.id_allocator.next(), item.category)
+
+        self.product_id_to_product.add(new_product)
+        self._index_product(new_product)
+        self.sellers[seller].add(new_product.id)
+        self.seller_listings.invalidate(seller.ip_port)
+        self.search_results.bump()
+        return new_product.id
+
+    def _product_changed(self, product_id, seller_ip_port):
+        # called after the change, still holding the locks it was made under
+        self.seller_listings.invalidate(seller_ip_port)
+        self.search_results.bump()
+
+    def _index_product(self, product):
+        self.name_index.setdefault(product.name, set()).add(product.id)
+        self.name_category_index.setdefault((product.name, product.category), set()).add(product.id)
+        self.partial_name_index.add(product.name, product.id)
+
+    def _unindex_product(self, product):
+        for index, key in ((self.name_index, product.name),
+                           (self.name_category_index, (product.name, product.category))):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(product.id)
+                if not ids:
+                    del index[key]
+        self.partial_name_index.remove(product.name, product.id)
+
+    def _search_ids(self, name, category, match=marketplace_pb2.EXACT, filters=None):
+        bounds = search_bounds(filters)
+        # If name is *, return all products, optionally narrowed down by category and filters
+        if name == "*":
+            if bounds or category not in ('all', ''):
+                return self.product_id_to_product.select(
+                    category=category if category not in ('all', '') else None, **bounds)
+            return self.product_id_to_product.keys()
+        ids = self._name_matches(name, category, match)
+        if bounds:
+            return self.product_id_to_product.select(ids, **bounds)
+        return ids
+
+    def _name_matches(self, name, category, match):
+        if match != marketplace_pb2.EXACT:
+            if match == marketplace_pb2.PREFIX:
+                ids = self.partial_name_index.prefix(name)
+            else:
+                ids = self.partial_name_index.substring(name)
+            if category != 'all':
+                ids = [product_id for product_id in ids
+                       if self.product_id_to_product[product_id].category == category]
+            return sorted(ids)
+        # If category is "all", return all products with matching name
+        if category == 'all':
+            ids = self.name_index.get(name, ())
+        # else return all products with matching name and category
+        else:
+            ids = self.name_category_index.get((name, category), ())
+        # ids are handed out in increasing order, sorting keeps the listing order of a full scan
+        return sorted(ids)
 
     # Seller functions
     def RegisterSeller(self, request, context):
-        log = " Seller join request from {}, uuid={}".format(
-            request.ip_port, request.uuid
-        )
-        print(log)
+        log = fields(method='RegisterSeller', ip_port=request.ip_port, uuid=request.uuid)
+        logger.debug("request", extra=log)
 
         seller = Seller(request.ip_port, request.uuid)
 
-        # if seller in sellers return fail message
-        if seller in self.sellers:
-            message = "Seller already registered"
-            print(log + " failed: " + message)
-            return marketplace_pb2.RegisterSellerResponse(
-                status="FAIL",
-                message=message
-            )
+        with self.catalog_lock.write():
+            # if seller in sellers return fail message
+            if seller in self.sellers:
+                message = "Seller already registered"
+                logger.info("failed: %s", message, extra=log)
+                return marketplace_pb2.RegisterSellerResponse(
+                    status="FAIL",
+                    message=message
+                )
 
-        self.sellers[seller] = set()
-        print(log + " success")
+            self.sellers[seller] = set()
+            seq = self._log_mutation('RegisterSeller', request)
+        self._wait_durable(seq)
+        logger.info("success", extra=log)
         return marketplace_pb2.RegisterSellerResponse(
             status="SUCCESS",
             message="Registered seller successfully"
         )
 
     def SellItem(self, request, context):
-        log = " Sell Item request from {}, uuid={}".format(request.ip_port, request.uuid)
-        print(log)
+        log = fields(method='SellItem', ip_port=request.ip_port, uuid=request.uuid)
+        logger.debug("request", extra=log)
         seller = Seller(request.ip_port, request.uuid)
 
-        if seller not in self.sellers:
-            message = "Seller not registered"
-            print(log + " failed: " + message)
-            seller_notification = marketplace_pb2.SellItemResponse(
-                status="FAIL",
-                message=message
-            )
-            return seller_notification
-
-        new_product = Product(request.name, request.price, request.quantity,
-                              request.description, request.ip_port, self.id_index, request.category)
-
-        self.product_id_to_product[self.id_index] = new_product
-        self.sellers[seller].add(self.id_index)
-        self.id_index += 1
-        print(log + " success")
+        with self.catalog_lock.write():
+            if seller not in self.sellers:
+                message = "Seller not registered"
+                logger.info("failed: %s", message, extra=log)
+                seller_notification = marketplace_pb2.SellItemResponse(
+                    status="FAIL",
+                    message=message
+                )
+                return seller_notification
+            if not self.product_id_to_product.has_room_for((request.category,)):
+                message = "Too many categories, list the item under an existing one"
+                logger.info("failed: %s", message, extra=log)
+                return marketplace_pb2.SellItemResponse(status="FAIL", message=message)
+
+            self._add_product(seller, request)
+            seq = self._log_mutation('SellItem', request)
+        self._wait_durable(seq)
+        logger.info("success", extra=log)
         return marketplace_pb2.SellItemResponse(message='Item Listed Successfully', status="SUCCESS")
 
     def DeleteItem(self, request, context):
-        log = " Delete Item {}[id] request from {}".format(
-            request._id, request.ip_port
-        )
-        print(log)
+        log = fields(method='DeleteItem', id=request._id, ip_port=request.ip_port)
+        logger.debug("request", extra=log)
 
-        product = self.product_id_to_product.get(request._id)
         seller = Seller(request.ip_port, request.uuid)
 
-        if seller not in self.sellers:
-            message = "Seller not found in sellers list"
-            print(log + " failed: " + message)
-            return marketplace_pb2.DeleteItemResponse(
-                status="FAIL",
-                message=message
-            )
+        with self.catalog_lock.write():
+            product = self.product_id_to_product.get(request._id)
 
-        if product:
-            if seller in self.sellers and request._id in self.sellers[seller]:
-                self.sellers[seller].remove(request._id)
-                del self.product_id_to_product[request._id]
-                message = "Deleted product successfully"
+            if seller not in self.sellers:
+                message = "Seller not found in sellers list"
+                logger.info("failed: %s", message, extra=log)
+                return marketplace_pb2.DeleteItemResponse(
+                    status="FAIL",
+                    message=message
+                )
 
-                for buyer in self.wishlist:
-                    self.wishlist[buyer].discard(request._id)
+            if not product:
+                message = "Product with requested id not found"
 
-                print(log + " success")
+                logger.info("failed: %s", message, extra=log)
                 return marketplace_pb2.DeleteItemResponse(
-                    status="SUCCESS",
+                    status="FAIL",
                     message=message
                 )
-            else:
+
+            if request._id not in self.sellers[seller]:
                 message = "Seller does not have the product with requested id"
 
-                print(log + " failed: " + message)
+                logger.info("failed: %s", message, extra=log)
                 return marketplace_pb2.DeleteItemResponse(
                     status="FAIL",
                     message=message
                 )
-        else:
-            message = "Product with requested id not found"
 
-            print(log + " failed: " + message)
-            return marketplace_pb2.DeleteItemResponse(
-                status="FAIL",
-                message=message
-            )
+            self.sellers[seller].remove(request._id)
+            # unindex first, the view can't be read once its row is gone
+            self._unindex_product(product)
+            del self.product_id_to_product[request._id]
+            self._product_changed(request._id, seller.ip_port)
+
+            for buyer in self.wishlisted_by.pop(request._id, ()):
+                self.wishlist[buyer].discard(request._id)
+            seq = self._log_mutation('DeleteItem', request)
+
+        self._wait_durable(seq)
+        logger.info("success", extra=log)
+        return marketplace_pb2.DeleteItemResponse(
+            status="SUCCESS",
+            message="Deleted product successfully"
+        )
 
     def DisplaySellerItems(self, request, context):
-        log = "Display Items request from {}, uuid={}".format(request.ip_port, request.uuid)
+        log = fields(method='DisplaySellerItems', ip_port=request.ip_port, uuid=request.uuid)
+        logger.debug("request", extra=log)
         seller = Seller(request.ip_port, request.uuid)
 
-        if seller not in self.sellers:
-            message = "Seller not found"
-            print(log + " failed: " + message)
-            return marketplace_pb2.DisplaySellerItemsResponse(output=message, status="FAIL")
+        with self.catalog_lock.read():
+            if seller not in self.sellers:
+                message = "Seller not found"
+                logger.info("failed: %s", message, extra=log)
+                return marketplace_pb2.DisplaySellerItemsResponse(output=message, status="FAIL")
+
+            # the cached listing is of the last seller viewed at this address
+            generation = self.seller_listings.generation(seller.ip_port)
+            cached = self.seller_listings.lookup(seller.ip_port)
+            if cached is not None and cached[0] == seller.uuid:
+                items_details = cached[1]
+            else:
+                items_details = "\n_________\n".join(str(self.product_id_to_product[product_id])
+                                                     for product_id in self.sellers[seller]
+                                                     if product_id in self.product_id_to_product)
+                self.seller_listings.store(seller.ip_port, (seller.uuid, items_details), generation)
+
+        logger.info("success", extra=log)
+        return marketplace_pb2.DisplaySellerItemsResponse(output=items_details, status="SUCCESS")
+
+    def _ranked_ids(self, request, cursor=0):
+        """
+        The ids SearchItem/SearchItemStream return for request, starting at cursor and cut
+        at request.limit. Only the top cursor + limit are ranked when sorting with a limit.
+        """
+        ids = self._search_ids(request.name, request.category, request.match, request.filters)
+        limit = request.limit or None
+
+        if request.sort_by == marketplace_pb2.ID:
+            if cursor:
+                ids = list(ids)
+                ids = ids[bisect.bisect_right(ids, cursor):]
+            return list(itertools.islice(ids, limit))
+
+        # newest first is the natural order for recency
+        descending = request.descending != (request.sort_by == marketplace_pb2.RECENCY)
+        ranked = self.product_id_to_product.order(ids, SORT_COLUMNS[request.sort_by], descending,
+                                                  cursor + limit if limit else None)
+        return ranked[cursor:]
 
-        items = []  # To store details of each item.
+    # buyer functions
+    def SearchItem(self, request, context):
+        log = fields(method='SearchItem', name=request.name, category=request.category, match=request.match,
+                     sort_by=request.sort_by, descending=request.descending, limit=request.limit)
+        logger.debug("request", extra=log)
 
-        if seller in self.sellers:
-            seller_items = self.sellers[seller]
-            for product_id in seller_items:
-                product = self.product_id_to_product.get(product_id)
-                if product:
-                    items.append(str(product))
+        message = search_error(request)
+        if message:
+            logger.info("failed: %s", message, extra=log)
+            return marketplace_pb2.SearchItemResponse(status="FAIL", message=message)
 
-            items_details = "\n_________\n".join(items)
-            print(log + " success")
-            print(self.product_id_to_product)
-            return marketplace_pb2.DisplaySellerItemsResponse(output=items_details, status="SUCCESS")
+        def search():
+            with self.catalog_lock.read():
+                return "".join(str(self.product_id_to_product[product_id]) + '\n'
+                               for product_id in self._ranked_ids(request))
 
-    # buyer functions
-    def SearchItem(self, request, context):
-        log = f'Search Item [name:{request.name}, category:{request.category}]'
-        print(log)
-
-        # If name is *, return all products
-        if request.name == "*":
-            message = ""
-            for product in self.product_id_to_product.values():
-                message += str(product)
-                message += '\n'
-
-            print(log + " success")
-            return marketplace_pb2.SearchItemResponse(
-                status="SUCCESS",
-                message=message,
-            )
-        # If category is "all", return all products with matching name
-        elif request.category == 'all':
-            message = ""
-            for product in self.product_id_to_product.values():
-                if product.name == request.name:
-                    message += str(product)
-                    message += '\n'
-            print(log + " success")
-            return marketplace_pb2.SearchItemResponse(
-                status="SUCCESS",
-                message=message
-            )
-        # else return all products with matching name and category
-        else:
-            message = ""
-            for product in self.product_id_to_product.values():
-                if (product.name == request.name) and (product.category == request.category):
-                    message += str(product)
-                    message += '\n'
-            # this is for the pseudo dynamic allocation of file register for the ALU in the 0x72 register to
-            # be converted
-            print(log + " success")
-            return marketplace_pb2.SearchItemResponse(
-                status="SUCCESS",
-                message=message,
-            )
+        # the request is the whole query: name, category, match, filters, order and limit
+        message = self.search_results.get(request.SerializeToString(deterministic=True), search)
 
-    def RateItem(self, request, context):
-        log = " Rate Item {}[id] request from {}".format(
-            request._id, request.buyer_ip_port
+        logger.info("success", extra=log)
+        return marketplace_pb2.SearchItemResponse(
+            status="SUCCESS",
+            message=message,
         )
-        print(log)
 
-        product = self.product_id_to_product.get(request._id)
+    def SearchItemStream(self, request, context):
+        log = fields(method='SearchItemStream', name=request.name, category=request.category, match=request.match,
+                     sort_by=request.sort_by, descending=request.descending, limit=request.limit,
+                     page_size=request.page_size, cursor=request.cursor)
+        logger.debug("request", extra=log)
+
+        message = search_error(request)
+        if message:
+            logger.info("failed: %s", message, extra=log)
+            yield marketplace_pb2.SearchItemPage(status="FAIL")
+            return
+
+        page_size = request.page_size or SEARCH_PAGE_SIZE
+        page_size = min(page_size, MAX_SEARCH_PAGE_SIZE)
+        by_id = request.sort_by == marketplace_pb2.ID
+
+        # take a copy of the matching ids, the catalog can change between pages
+        with self.catalog_lock.read():
+            ids = self._ranked_ids(request, request.cursor)
+
+        # the read lock is only held while a page is built, never while the client consumes it
+        for page_start in range(0, len(ids), page_size):
+            page_ids = ids[page_start:page_start + page_size]
+            with self.catalog_lock.read():
+                # skip the ones deleted after the search started
+                page = [product_to_message(self.product_id_to_product[product_id]) for product_id in page_ids
+                        if product_id in self.product_id_to_product]
+            if page_start + page_size < len(ids):
+                # sorted results resume by position, listing order by the last id
+                next_cursor = page_ids[-1] if by_id else request.cursor + page_start + page_size
+                yield marketplace_pb2.SearchItemPage(products=page, next_cursor=next_cursor, status="SUCCESS")
+            else:
+                logger.info("success", extra=log)
+                yield marketplace_pb2.SearchItemPage(products=page, next_cursor=0, status="SUCCESS")
+                return
+
+        logger.info("success", extra=log)
+        yield marketplace_pb2.SearchItemPage(products=[], next_cursor=0, status="SUCCESS")
+
+    def RateItem(self, request, context):
+        log = fields(method='RateItem', id=request._id, ip_port=request.buyer_ip_port)
+        logger.debug("request", extra=log)
+
         buyer = Buyer(request.buyer_ip_port)
-        if buyer not in self.rated_items:
-            self.rated_items[buyer] = set()
-
-        if product:
-            thing = request._id
-            if thing in self.rated_items[buyer]:
-                message = "Product already rated by the buyer"
-                print(log + " failed: " + message)
+
+        with self.catalog_lock.read():
+            product = self.product_id_to_product.get(request._id)
+
+            if product:
+                with self.buyer_locks.for_key(buyer):
+                    rated_items = self.rated_items.setdefault(buyer, set())
+                    if request._id in rated_items:
+                        message = "Product already rated by the buyer"
+                        logger.info("failed: %s", message, extra=log)
+                        return marketplace_pb2.RateItemResponse(
+                            status="FAIL",
+                            message=message
+                        )
+                    rated_items.add(request._id)
+
+                with self.product_locks.for_key(request._id):
+                    product.n_ratings += 1
+                    product.rating += (request.rating - product.rating) / product.n_ratings
+                    self._product_changed(request._id, product.seller_ip_port)
+                    seq = self._log_mutation('RateItem', request)
+            else:
+                message = "Product with requested id not found"
+                logger.info("failed: %s", message, extra=log)
                 return marketplace_pb2.RateItemResponse(
                     status="FAIL",
                     message=message
                 )
 
-            self.rated_items[buyer].add(request._id)
-            product.n_ratings += 1
-            product.rating += (request.rating - product.rating) / product.n_ratings
-            message = "Rated product successfully"
-            print(log + " success")
-            return marketplace_pb2.RateItemResponse(
-                status="SUCCESS",
-                message=message
-            )
-        else:
-            message = "Product with requested id not found"
-            print(log + " failed: " + message)
-            return marketplace_pb2.RateItemResponse(
-                status="FAIL",
-                message=message
-            )
+        self._wait_durable(seq)
+        logger.info("success", extra=log)
+        return marketplace_pb2.RateItemResponse(
+            status="SUCCESS",
+            message="Rated product successfully"
+        )
 
     def WishlistItem(self, request, context):
-        log = (" Wishlist request of item {}[item id], from {}".
-               format(request._id, request.buyer_ip_port))
-        print(log)
+        log = fields(method='WishlistItem', id=request._id, ip_port=request.buyer_ip_port)
+        logger.debug("request", extra=log)
 
         buyer = Buyer(request.buyer_ip_port)
-        product_to_wishlist = self.product_id_to_product.get(request._id)
-
-        # If the product does not exist just say no
-        if product_to_wishlist is None:
-            message = "Product with requested id not found"
-            print(log + " failed: " + message)
-            return marketplace_pb2.WishlistResponse(
-                status="FAIL",
-                message=message
-            )
 
-        # just in case you weren't there already
-        if buyer not in self.wishlist:
-            self.wishlist[buyer] = set()
+        # DeleteItem cleans wishlists under the write lock, so hold the read lock
+        # to not wishlist a product that is being deleted
+        with self.catalog_lock.read():
+            product_to_wishlist = self.product_id_to_product.get(request._id)
 
-        # you shouldn't redo it tho
-        thing = request._id
-        if thing in self.wishlist[buyer]:
-            message = "Product already in wishlist"
-            print(log + " failed: " + message)
-            return marketplace_pb2.WishlistResponse(
-                status="FAIL",
-                message=message
-            )
+            # If the product does not exist just say no
+            if product_to_wishlist is None:
+                message = "Product with requested id not found"
+                logger.info("failed: %s", message, extra=log)
+                return marketplace_pb2.WishlistResponse(
+                    status="FAIL",
+                    message=message
+                )
 
-        self.wishlist[buyer].add(request._id)
-        print(log + " succeeded")
+            with self.buyer_locks.for_key(buyer):
+                # just in case you weren't there already
+                wishlist = self.wishlist.setdefault(buyer, set())
+
+                # you shouldn't redo it tho
+                if request._id in wishlist:
+                    message = "Product already in wishlist"
+                    logger.info("failed: %s", message, extra=log)
+                    return marketplace_pb2.WishlistResponse(
+                        status="FAIL",
+                        message=message
+                    )
+
+                wishlist.add(request._id)
+            with self.product_locks.for_key(request._id):
+                self.wishlisted_by.setdefault(request._id, set()).add(buyer)
+            seq = self._log_mutation('WishlistItem', request)
+        self._wait_durable(seq)
+        logger.info("success", extra=log)
         return marketplace_pb2.WishlistResponse(
             status="SUCCESS",
             message="Added product to your wishlist"
@@ -268,88 +585,314 @@ class MarketplaceService(marketplace_pb2_grpc.MarketplaceServicer):
 
     # notifying methods
     def BuyItem(self, request, context):
-        log = " Buy Item {}[id] request from {}".format(request._id, request.ip_port)
-        print(log)
-
-        product = self.product_id_to_product.get(request._id)
-
-        if product:
-            if product.quantity >= request.quantity:
-                product.quantity -= request.quantity
-                # # message = "Bought product successfully"
-                # market_client = MarketClient(product.seller_ip_port)
-                # notif_message = "Your product with id {} has sold {} units".format(request._id, product.quantity)
-                # market_client.notify(notif_message)
+        log = fields(method='BuyItem', id=request._id, quantity=request.quantity, ip_port=request.ip_port,
+                     request_id=request.request_id)
+        logger.debug("request", extra=log)
+
+        if not request.request_id:
+            return self._buy_item(request, log)
+        response, retried = self.buy_responses.run((request.ip_port, request.request_id),
+                                                   lambda: self._buy_item(request, log))
+        if retried:
+            logger.info("retry, answered with the first response", extra=log)
+        return response
+
+    def _buy_item(self, request, log):
+        if request.quantity <= 0:
+            message = "Quantity must be positive"
+            logger.info("failed: %s", message, extra=log)
+            return marketplace_pb2.BuyItemResponse(
+                status="FAIL",
+            )
 
-                print(log + " success")
-                return marketplace_pb2.BuyItemResponse(
-                    status="SUCCESS",
-                )
+        with self.catalog_lock.read():
+            product = self.product_id_to_product.get(request._id)
+
+            if product:
+                # compare and decrement under the product's lock, or two buyers can take the last unit
+                with self.product_locks.for_key(request._id):
+                    remaining = self.product_id_to_product.take(request._id, request.quantity)
+                    in_stock = remaining is not None
+                    if in_stock:
+                        seller_ip_port = product.seller_ip_port
+                        self._product_changed(request._id, seller_ip_port)
+                        seq = self._log_mutation('BuyItem', request)
+                        response = marketplace_pb2.BuyItemResponse(status="SUCCESS")
+                        if request.request_id:
+                            # with the purchase, so no snapshot has one without the other
+                            self.buy_responses.remember((request.ip_port, request.request_id), response)
+                if not in_stock:
+                    message = "Requested quantity not available"
+                    logger.info("failed: %s", message, extra=log)
+                    return marketplace_pb2.BuyItemResponse(
+                        status="FAIL",
+                    )
             else:
-                message = "Requested quantity not available"
-                print(log + " failed: " + message)
+                message = "Product with requested id not found"
+                logger.info("failed: %s", message, extra=log)
                 return marketplace_pb2.BuyItemResponse(
                     status="FAIL",
                 )
-        else:
-            message = "Product with requested id not found"
-            print(log + " failed: " + message)
-            return marketplace_pb2.BuyItemResponse(
-                status="FAIL",
-            )
+
+        self._wait_durable(seq)
+        self._notify(seller_ip_port,
+                     "Your product with id {} has sold {} units, {} left".format(
+                         request._id, request.quantity, remaining))
+
+        logger.info("success", extra=log)
+        return response
 
     def UpdateItem(self, request, context):
-        log = " Update Item {}[id] request from {}".format(
-            request._id, request.ip_port
-        )
-        print(log)
+        log = fields(method='UpdateItem', id=request._id, ip_port=request.ip_port)
+        logger.debug("request", extra=log)
 
-        product = self.product_id_to_product.get(request._id)
         seller = Seller(request.ip_port, request.uuid)
 
-        if product:
-            thing = request._id
-            if thing not in self.sellers[seller]:
-                message = "Seller does not have an item with the requested id"
-                print(log + " failed: " + message)
+        with self.catalog_lock.read():
+            product = self.product_id_to_product.get(request._id)
+
+            if product:
+                thing = request._id
+                if thing not in self.sellers.get(seller, ()):
+                    message = "Seller does not have an item with the requested id"
+                    logger.info("failed: %s", message, extra=log)
+                    return marketplace_pb2.UpdateItemResponse(
+                        status="FAIL",
+                    )
+
+                with self.product_locks.for_key(request._id):
+                    product.price = request.new_price
+                    product.quantity = request.new_quantity
+                    self._product_changed(request._id, seller.ip_port)
+                    buyers_to_notify = set(self.wishlisted_by.get(request._id, ()))
+                    seq = self._log_mutation('UpdateItem', request)
+            else:
+                message = "Product with requested id not found"
+
+                logger.info("failed: %s", message, extra=log)
                 return marketplace_pb2.UpdateItemResponse(
                     status="FAIL",
                 )
 
-            product.price = request.new_price
-            product.quantity = request.new_quantity
-            message = "Updated product"
-
-            # buyers_to_notify = set()
-            # for buyer in self.wishlist:
-            #     if request._id in self.wishlist[buyer]:
-            #         buyers_to_notify.add(buyer)
-            # for buyer in buyers_to_notify:
-            #     market_client = MarketClient(buyer.ip_port)
-            #     message = ("Item {} has been updated! New price {} and quantity {}".
-            #                format(request._id, request.new_price, request.new_quantity))
-            #     market_client.notify(message)
-
-            print(log + " success")
-            return marketplace_pb2.UpdateItemResponse(
-                status="SUCCESS",
-            )
-        else:
-            message = "Product with requested id not found"
+        self._wait_durable(seq)
+        for buyer in buyers_to_notify:
+            self._notify(buyer.ip_port, "Item {} has been updated! New price {} and quantity {}".
+                         format(request._id, request.new_price, request.new_quantity))
 
-            print(log + " failed: " + message)
-            return marketplace_pb2.UpdateItemResponse(
-                status="FAIL",
-            )
+        logger.info("success", extra=log)
+        return marketplace_pb2.UpdateItemResponse(
+            status="SUCCESS",
+        )
 
+    # batch functions, each takes the catalog lock and writes the log once for the whole batch
+    def SellItems(self, request, context):
+        log = fields(method='SellItems', items=len(request.items), ip_port=request.ip_port, uuid=request.uuid)
+        logger.debug("request", extra=log)
+        seller = Seller(request.ip_port, request.uuid)
+
+        with self.catalog_lock.write():
+            if seller not in self.sellers:
+                message = "Seller not registered"
+                logger.info("failed: %s", message, extra=log)
+                return marketplace_pb2.BatchResponse(status="FAIL", message=message)
+            # checked up front, a batch is added in full or not at all
+            if not self.product_id_to_product.has_room_for({item.category for item in request.items}):
+                message = "Too many categories, list the items under existing ones"
+                logger.info("failed: %s", message, extra=log)
+                return marketplace_pb2.BatchResponse(status="FAIL", message=message)
+
+            results = [marketplace_pb2.ItemStatus(_id=self._add_product(seller, item), status="SUCCESS",
+                                                  message="Item Listed Successfully")
+                       for item in request.items]
+            seq = self._log_mutation('SellItems', request) if results else 0
+        self._wait_durable(seq)
+        logger.info("success", extra=log)
+        return marketplace_pb2.BatchResponse(status="SUCCESS", results=results)
+
+    def UpdateItems(self, request, context):
+        log = fields(method='UpdateItems', items=len(request.items), ip_port=request.ip_port, uuid=request.uuid)
+        logger.debug("request", extra=log)
+        seller = Seller(request.ip_port, request.uuid)
 
-def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    marketplace_pb2_grpc.add_MarketplaceServicer_to_server(MarketplaceService(), server)
-    server.add_insecure_port('[::]:50051')
+        results = []
+        notifications = []
+        # exclusive, so the one log record of the batch can't be reordered
+        # against single item updates and purchases of the same products
+        with self.catalog_lock.write():
+            seller_items = self.sellers.get(seller, ())
+            for item in request.items:
+                product = self.product_id_to_product.get(item._id)
+                if not product:
+                    results.append(marketplace_pb2.ItemStatus(
+                        _id=item._id, status="FAIL", message="Product with requested id not found"))
+                    continue
+                if item._id not in seller_items:
+                    results.append(marketplace_pb2.ItemStatus(
+                        _id=item._id, status="FAIL", message="Seller does not have an item with the requested id"))
+                    continue
+
+                product.price = item.new_price
+                product.quantity = item.new_quantity
+                self._product_changed(item._id, seller.ip_port)
+                for buyer in self.wishlisted_by.get(item._id, ()):
+                    notifications.append((buyer.ip_port, "Item {} has been updated! New price {} and quantity {}".
+                                          format(item._id, item.new_price, item.new_quantity)))
+                results.append(marketplace_pb2.ItemStatus(_id=item._id, status="SUCCESS", message="Updated product"))
+
+            succeeded = any(result.status == "SUCCESS" for result in results)
+            seq = self._log_mutation('UpdateItems', request) if succeeded else 0
+
+        self._wait_durable(seq)
+        for address, message in notifications:
+            self._notify(address, message)
+        logger.info("success", extra=log)
+        return marketplace_pb2.BatchResponse(status="SUCCESS", results=results)
+
+    def BuyItems(self, request, context):
+        log = fields(method='BuyItems', items=len(request.items), ip_port=request.ip_port)
+        logger.debug("request", extra=log)
+
+        results = []
+        notifications = []
+        with self.catalog_lock.write():
+            for item in request.items:
+                product = self.product_id_to_product.get(item._id)
+                if not product:
+                    results.append(marketplace_pb2.ItemStatus(
+                        _id=item._id, status="FAIL", message="Product with requested id not found"))
+                    continue
+                if item.quantity <= 0:
+                    results.append(marketplace_pb2.ItemStatus(
+                        _id=item._id, status="FAIL", message="Quantity must be positive"))
+                    continue
+                remaining = self.product_id_to_product.take(item._id, item.quantity)
+                if remaining is None:
+                    results.append(marketplace_pb2.ItemStatus(
+                        _id=item._id, status="FAIL", message="Requested quantity not available"))
+                    continue
+                self._product_changed(item._id, product.seller_ip_port)
+
+                notifications.append((product.seller_ip_port, "Your product with id {} has sold {} units, {} left".
+                                      format(item._id, item.quantity, remaining)))
+                results.append(marketplace_pb2.ItemStatus(_id=item._id, status="SUCCESS",
+                                                          message="Bought product successfully"))
+
+            seq = self._log_mutation('BuyItems', request) if notifications else 0
+
+        self._wait_durable(seq)
+        for address, message in notifications:
+            self._notify(address, message)
+        logger.info("success", extra=log)
+        return marketplace_pb2.BatchResponse(status="SUCCESS", results=results)
+
+    def Subscribe(self, request, context):
+        log = fields(method='Subscribe', ip_port=request.ip_port, all_recipients=request.all_recipients)
+        logger.info("stream opened", extra=log)
+        try:
+            yield from self.subscriptions.stream(request, context)
+        finally:
+            logger.info("stream closed", extra=log)
+
+
+def serve(port=50051, max_workers=MAX_WORKERS, service=None, data_dir=None, metrics_port=None,
+          primary=False, replica_of=None, admission=None, lanes=None, max_streams=MAX_STREAMS,
+          max_concurrent_rpcs=None, dial_back=False):
+    if replica_of is not None:
+        from replication import ReplicaService
+        service = ReplicaService(replica_of).start()
+    if service is None:
+        service = MarketplaceService(NotificationDispatcher().start() if dial_back else None)
+    if data_dir is not None:
+        Persistence(service, data_dir).start()
+    # workers per lane, see scheduling.py. Without lanes max_workers serve every RPC but the
+    # streams, which always get their own lane so they can't take every worker
+    executor = LaneExecutor(with_stream_lane(lanes or {DEFAULT_LANE: max_workers}, max_streams))
+    interceptors = []
+    if metrics_port is not None:
+        metrics = Metrics()
+        metrics.track_service(service)
+        metrics.gauge('marketplace_streams_refused', lambda: executor.refused)
+        serve_metrics(metrics, metrics_port)
+        interceptors.append(MetricsInterceptor(metrics))
+        logger.info("Serving metrics on port %s", metrics_port)
+    # after metrics, so refused requests are counted too
+    if admission is not None:
+        interceptors.append(AdmissionInterceptor(admission))
+        if metrics_port is not None:
+            metrics.gauge('marketplace_admission_rejected', lambda: admission.rejected)
+    interceptors.insert(0, LaneInterceptor(executor))
+    # past max_concurrent_rpcs (streams included) grpc refuses RPCs before they reach the pool
+    server = grpc.server(executor, interceptors=interceptors, options=SERVER_OPTIONS,
+                         maximum_concurrent_rpcs=max_concurrent_rpcs)
+    marketplace_pb2_grpc.add_MarketplaceServicer_to_server(service, server)
+    if primary:
+        from replication import ReplicationService
+        marketplace_pb2_grpc.add_ReplicationServicer_to_server(ReplicationService(service), server)
+    server.add_insecure_port(f'[::]:{port}')
     server.start()
-    print("Listening on port 50051")
+    logger.info("Listening on port %s", port)
     server.wait_for_termination()
 
 
-serve()
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='SaharaOSP marketplace server')
+    parser.add_argument('--port', type=int, default=50051)
+    parser.add_argument('--max-workers', type=int, default=MAX_WORKERS)
+    parser.add_argument('--lanes', type=parse_lanes, metavar='LANE=N,...',
+                        help='separate worker pools per kind of RPC instead of --max-workers, '
+                             'e.g. point=16,scan=4,stream=64')
+    parser.add_argument('--max-streams', type=int, default=MAX_STREAMS,
+                        help='Subscribe streams held at once by the threaded server, more are refused')
+    parser.add_argument('--aio', action='store_true', help='serve with grpc.aio instead of a thread per request')
+    parser.add_argument('--shards', type=int, default=0,
+                        help='partition the catalog over this many local worker processes behind a router')
+    parser.add_argument('--shard-base-port', type=int, default=50061)
+    parser.add_argument('--data-dir', help='keep a write-ahead log and snapshots here and recover from them')
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    parser.add_argument('--metrics-port', type=int, help='serve per-RPC metrics over HTTP on this port')
+    parser.add_argument('--primary', action='store_true', help='publish a change feed for read replicas')
+    parser.add_argument('--replica-of', metavar='HOST:PORT',
+                        help='serve searches and seller listings from a copy of this primary')
+    parser.add_argument('--rate-limit', type=float, default=0,
+                        help='requests a second each client may make, 0 for no limit')
+    parser.add_argument('--burst', type=int, help='requests a client may make at once, the rate limit by default')
+    parser.add_argument('--concurrency-limit', action='append', metavar='METHOD=N',
+                        help='at most N requests of METHOD running at once, can be repeated')
+    parser.add_argument('--notify-dial-back', action='store_true',
+                        help='send the notifications of clients without a Subscribe stream to the '
+                             'notification server at their ip_port, for clients that run one')
+    parser.add_argument('--max-concurrent-rpcs', type=int,
+                        help='at most this many RPCs running or queued (streams included): the threaded '
+                             'server refuses the rest before they wait for a worker, the asyncio one holds them back')
+    args = parser.parse_args()
+    admission = None
+    if args.rate_limit or args.concurrency_limit:
+        admission = AdmissionControl(args.rate_limit, args.burst, parse_method_limits(args.concurrency_limit))
+    if args.shards and args.aio:
+        parser.error('--shards runs a threaded router in front of threaded shards, it has no asyncio version')
+    if args.lanes and args.aio:
+        parser.error('--lanes only works with the threaded server, the asyncio one runs RPCs on its event loop')
+    if args.replica_of and args.notify_dial_back:
+        parser.error('a replica sends no notifications, its primary does')
+    if (args.primary or args.replica_of) and (args.shards or args.aio):
+        parser.error('--primary and --replica-of only work with the threaded server')
+    if args.replica_of and (args.primary or args.data_dir):
+        parser.error('a replica keeps no log of its own and has no replicas')
+    configure_logging(args.log_level)
+
+    if args.shards:
+        from sharding import serve_sharded
+        serve_sharded(args.shards, args.port, args.shard_base_port, args.max_workers, args.data_dir, args.log_level,
+                      args.metrics_port, admission, args.lanes, args.max_streams, args.max_concurrent_rpcs,
+                      args.notify_dial_back)
+    elif args.aio:
+        import asyncio
+        from marketplace_aio import serve_aio
+        asyncio.run(serve_aio(args.port, args.max_workers, data_dir=args.data_dir, metrics_port=args.metrics_port,
+                              admission=admission, max_concurrent_rpcs=args.max_concurrent_rpcs,
+                              dial_back=args.notify_dial_back))
+    else:
+        serve(args.port, args.max_workers, data_dir=args.data_dir, metrics_port=args.metrics_port,
+              primary=args.primary, replica_of=args.replica_of, admission=admission, lanes=args.lanes,
+              max_streams=args.max_streams, max_concurrent_rpcs=args.max_concurrent_rpcs,
+              dial_back=args.notify_dial_back)
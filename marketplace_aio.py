@@ -0,0 +1,148 @@
+import asyncio
+import logging
+from concurrent import futures
+
+import grpc
+
+from admission import AsyncAdmissionInterceptor
+from marketplace import MAX_WORKERS, SERVER_OPTIONS, MarketplaceService
+from metrics import AsyncMetricsInterceptor, Metrics, serve_metrics
+from notifications import SUBSCRIPTION_QUEUE_SIZE, NotificationDispatcher, Subscription
+from persistence import Persistence
+from structured_logging import fields
+
+import marketplace_pb2_grpc
+
+# marks the end of a generator advanced from the executor
+_EXHAUSTED = object()
+
+logger = logging.getLogger('marketplace.service')
+
+
+class AsyncSubscription(Subscription):
+    """A Subscription whose stream waits on the event loop instead of holding a thread."""
+
+    def __init__(self, address, loop, max_queue=SUBSCRIPTION_QUEUE_SIZE):
+        self.address = address
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_queue)
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.warning("Subscriber is not keeping up, dropped a notification", extra=fields(address=self.address))
+
+    def deliver(self, message):
+        # called from handler threads, the queue belongs to the loop
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class AsyncMarketplaceService(marketplace_pb2_grpc.MarketplaceServicer):
+    """
+    grpc.aio front for a MarketplaceService. Connections and in-flight RPCs live on the
+    event loop; only the handler bodies run on a small executor, because they take the
+    service's blocking locks. Both servers can share the same MarketplaceService state.
+    """
+
+    def __init__(self, service: MarketplaceService, executor=None):
+        self.service = service
+        self.executor = executor or futures.ThreadPoolExecutor(max_workers=MAX_WORKERS)
+
+    async def _call(self, handler, request, context):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, handler, request, context)
+
+    async def _stream(self, handler, request, context):
+        loop = asyncio.get_running_loop()
+        responses = handler(request, context)
+        while True:
+            response = await loop.run_in_executor(self.executor, next, responses, _EXHAUSTED)
+            if response is _EXHAUSTED:
+                return
+            yield response
+
+    async def RegisterSeller(self, request, context):
+        return await self._call(self.service.RegisterSeller, request, context)
+
+    async def DeleteItem(self, request, context):
+        return await self._call(self.service.DeleteItem, request, context)
+
+    async def DisplaySellerItems(self, request, context):
+        return await self._call(self.service.DisplaySellerItems, request, context)
+
+    async def SellItem(self, request, context):
+        return await self._call(self.service.SellItem, request, context)
+
+    async def SearchItem(self, request, context):
+        return await self._call(self.service.SearchItem, request, context)
+
+    async def SearchItemStream(self, request, context):
+        async for page in self._stream(self.service.SearchItemStream, request, context):
+            yield page
+
+    async def RateItem(self, request, context):
+        return await self._call(self.service.RateItem, request, context)
+
+    async def WishlistItem(self, request, context):
+        return await self._call(self.service.WishlistItem, request, context)
+
+    async def UpdateItem(self, request, context):
+        return await self._call(self.service.UpdateItem, request, context)
+
+    async def BuyItem(self, request, context):
+        return await self._call(self.service.BuyItem, request, context)
+
+    async def SellItems(self, request, context):
+        return await self._call(self.service.SellItems, request, context)
+
+    async def UpdateItems(self, request, context):
+        return await self._call(self.service.UpdateItems, request, context)
+
+    async def BuyItems(self, request, context):
+        return await self._call(self.service.BuyItems, request, context)
+
+    async def Subscribe(self, request, context):
+        log = fields(method='Subscribe', ip_port=request.ip_port, all_recipients=request.all_recipients)
+        logger.info("stream opened", extra=log)
+        subscription = self.service.subscriptions.add(
+            AsyncSubscription(None if request.all_recipients else request.ip_port, asyncio.get_running_loop()))
+        try:
+            while True:
+                yield await subscription.get()
+        finally:
+            # also reached when the client goes away and the stream is cancelled
+            self.service.subscriptions.remove(subscription)
+            logger.info("stream closed", extra=log)
+
+
+async def serve_aio(port=50051, max_workers=MAX_WORKERS, service=None, data_dir=None, metrics_port=None,
+                    admission=None, max_concurrent_rpcs=None, dial_back=False):
+    if service is None:
+        service = MarketplaceService(NotificationDispatcher().start() if dial_back else None)
+    if data_dir is not None:
+        Persistence(service, data_dir).start()
+    interceptors = []
+    if metrics_port is not None:
+        metrics = Metrics()
+        metrics.track_service(service)
+        serve_metrics(metrics, metrics_port)
+        interceptors.append(AsyncMetricsInterceptor(metrics))
+        logger.info("Serving metrics on port %s", metrics_port)
+    if admission is not None:
+        interceptors.append(AsyncAdmissionInterceptor(admission))
+        if metrics_port is not None:
+            metrics.gauge('marketplace_admission_rejected', lambda: admission.rejected)
+    # admission runs on the event loop before a handler takes an executor thread; past
+    # max_concurrent_rpcs grpc.aio stops accepting calls until running ones finish
+    server = grpc.aio.server(interceptors=interceptors, options=SERVER_OPTIONS,
+                             maximum_concurrent_rpcs=max_concurrent_rpcs)
+    marketplace_pb2_grpc.add_MarketplaceServicer_to_server(
+        AsyncMarketplaceService(service, futures.ThreadPoolExecutor(max_workers=max_workers)), server)
+    server.add_insecure_port(f'[::]:{port}')
+    await server.start()
+    logger.info("Listening on port %s (asyncio)", port)
+    await server.wait_for_termination()
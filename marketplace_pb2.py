@@ -14,55 +14,93 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x11marketplace.proto\"(\n\x14NotificationResponse\x12\x10\n\x08response\x18\x01 \x01(\t\"&\n\x13NotificationRequest\x12\x0f\n\x07request\x18\x01 \x01(\t\"h\n\x11UpdateItemRequest\x12\x0b\n\x03_id\x18\x01 \x01(\x05\x12\x11\n\tnew_price\x18\x02 \x01(\x01\x12\x14\n\x0cnew_quantity\x18\x03 \x01(\x05\x12\x0f\n\x07ip_port\x18\x04 \x01(\t\x12\x0c\n\x04uuid\x18\x05 \x01(\t\"6\n\x12UpdateItemResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x10\n\x08\x62uyer_id\x18\x02 \x01(\t\"@\n\x0e\x42uyItemRequest\x12\x0b\n\x03_id\x18\x01 \x01(\x05\x12\x10\n\x08quantity\x18\x02 \x01(\x05\x12\x0f\n\x07ip_port\x18\x03 \x01(\t\"!\n\x0f\x42uyItemResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\"6\n\x15RegisterSellerRequest\x12\x0f\n\x07ip_port\x18\x01 \x01(\t\x12\x0c\n\x04uuid\x18\x02 \x01(\t\"9\n\x16RegisterSellerResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\"?\n\x11\x44\x65leteItemRequest\x12\x0b\n\x03_id\x18\x01 \x01(\x05\x12\x0f\n\x07ip_port\x18\x02 \x01(\t\x12\x0c\n\x04uuid\x18\x03 \x01(\t\"5\n\x12\x44\x65leteItemResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\":\n\x19\x44isplaySellerItemsRequest\x12\x0f\n\x07ip_port\x18\x01 \x01(\t\x12\x0c\n\x04uuid\x18\x02 \x01(\t\"<\n\x1a\x44isplaySellerItemsResponse\x12\x0e\n\x06output\x18\x01 \x01(\t\x12\x0e\n\x06status\x18\x02 \x01(\t\"\x86\x01\n\x0fSellItemRequest\x12\x0f\n\x07ip_port\x18\x01 \x01(\t\x12\x0c\n\x04uuid\x18\x02 \x01(\t\x12\x0c\n\x04name\x18\x03 \x01(\t\x12\r\n\x05price\x18\x04 \x01(\x02\x12\x10\n\x08quantity\x18\x05 \x01(\x05\x12\x13\n\x0b\x64\x65scription\x18\x06 \x01(\t\x12\x10\n\x08\x63\x61tegory\x18\x07 \x01(\t\"3\n\x10SellItemResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\"3\n\x11SearchItemRequest\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x10\n\x08\x63\x61tegory\x18\x02 \x01(\t\"5\n\x12SearchItemResponse\x12\x0f\n\x07message\x18\x01 \x01(\t\x12\x0e\n\x06status\x18\x02 \x01(\t\"E\n\x0fRateItemRequest\x12\x0b\n\x03_id\x18\x01 \x01(\x05\x12\x15\n\rbuyer_ip_port\x18\x02 \x01(\t\x12\x0e\n\x06rating\x18\x03 \x01(\x05\"3\n\x10RateItemResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\"5\n\x0fWishlistRequest\x12\x15\n\rbuyer_ip_port\x18\x01 \x01(\t\x12\x0b\n\x03_id\x18\x02 \x01(\x05\"3\n\x10WishlistResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t2\x8b\x04\n\x0bMarketplace\x12\x41\n\x0eRegisterSeller\x12\x16.RegisterSellerRequest\x1a\x17.RegisterSellerResponse\x12\x35\n\nDeleteItem\x12\x12.DeleteItemRequest\x1a\x13.DeleteItemResponse\x12M\n\x12\x44isplaySellerItems\x12\x1a.DisplaySellerItemsRequest\x1a\x1b.DisplaySellerItemsResponse\x12/\n\x08SellItem\x12\x10.SellItemRequest\x1a\x11.SellItemResponse\x12\x35\n\nSearchItem\x12\x12.SearchItemRequest\x1a\x13.SearchItemResponse\x12/\n\x08RateItem\x12\x10.RateItemRequest\x1a\x11.RateItemResponse\x12\x35\n\x0cWishlistItem\x12\x10.WishlistRequest\x1a\x11.WishlistResponse\"\x00\x12\x35\n\nUpdateItem\x12\x12.UpdateItemRequest\x1a\x13.UpdateItemResponse\x12,\n\x07\x42uyItem\x12\x0f.BuyItemRequest\x1a\x10.BuyItemResponse2O\n\x0cnotification\x12?\n\x10SendNotification\x12\x14.NotificationRequest\x1a\x15.NotificationResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x11marketplace.proto\"(\n\x14NotificationResponse\x12\x10\n\x08response\x18\x01 \x01(\t\"&\n\x13NotificationRequest\x12\x0f\n\x07request\x18\x01 \x01(\t\";\n\x10SubscribeRequest\x12\x0f\n\x07ip_port\x18\x01 \x01(\t\x12\x16\n\x0e\x61ll_recipients\x18\x02 \x01(\x08\"0\n\x0cNotification\x12\x0f\n\x07message\x18\x01 \x01(\t\x12\x0f\n\x07ip_port\x18\x02 \x01(\t\"h\n\x11UpdateItemRequest\x12\x0b\n\x03_id\x18\x01 \x01(\x05\x12\x11\n\tnew_price\x18\x02 \x01(\x01\x12\x14\n\x0cnew_quantity\x18\x03 \x01(\x05\x12\x0f\n\x07ip_port\x18\x04 \x01(\t\x12\x0c\n\x04uuid\x18\x05 \x01(\t\"6\n\x12UpdateItemResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x10\n\x08\x62uyer_id\x18\x02 \x01(\t\"T\n\x0e\x42uyItemRequest\x12\x0b\n\x03_id\x18\x01 \x01(\x05\x12\x10\n\x08quantity\x18\x02 \x01(\x05\x12\x0f\n\x07ip_port\x18\x03 \x01(\t\x12\x12\n\nrequest_id\x18\x04 \x01(\t\"!\n\x0f\x42uyItemResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\"6\n\x15RegisterSellerRequest\x12\x0f\n\x07ip_port\x18\x01 \x01(\t\x12\x0c\n\x04uuid\x18\x02 \x01(\t\"9\n\x16RegisterSellerResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\"?\n\x11\x44\x65leteItemRequest\x12\x0b\n\x03_id\x18\x01 \x01(\x05\x12\x0f\n\x07ip_port\x18\x02 \x01(\t\x12\x0c\n\x04uuid\x18\x03 \x01(\t\"5\n\x12\x44\x65leteItemResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\":\n\x19\x44isplaySellerItemsRequest\x12\x0f\n\x07ip_port\x18\x01 \x01(\t\x12\x0c\n\x04uuid\x18\x02 \x01(\t\"<\n\x1a\x44isplaySellerItemsResponse\x12\x0e\n\x06output\x18\x01 \x01(\t\x12\x0e\n\x06status\x18\x02 \x01(\t\"\x86\x01\n\x0fSellItemRequest\x12\x0f\n\x07ip_port\x18\x01 \x01(\t\x12\x0c\n\x04uuid\x18\x02 \x01(\t\x12\x0c\n\x04name\x18\x03 \x01(\t\x12\r\n\x05price\x18\x04 \x01(\x02\x12\x10\n\x08quantity\x18\x05 \x01(\x05\x12\x13\n\x0b\x64\x65scription\x18\x06 \x01(\t\x12\x10\n\x08\x63\x61tegory\x18\x07 \x01(\t\"3\n\x10SellItemResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\"\x95\x01\n\rSearchFilters\x12\x16\n\tmin_price\x18\x01 \x01(\x01H\x00\x88\x01\x01\x12\x16\n\tmax_price\x18\x02 \x01(\x01H\x01\x88\x01\x01\x12\x17\n\nmin_rating\x18\x03 \x01(\x01H\x02\x88\x01\x01\x12\x10\n\x08in_stock\x18\x04 \x01(\x08\x42\x0c\n\n_min_priceB\x0c\n\n_max_priceB\r\n\x0b_min_rating\"\xac\x01\n\x11SearchItemRequest\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x10\n\x08\x63\x61tegory\x18\x02 \x01(\t\x12\x19\n\x05match\x18\x03 \x01(\x0e\x32\n.MatchMode\x12\x1f\n\x07\x66ilters\x18\x04 \x01(\x0b\x32\x0e.SearchFilters\x12\x18\n\x07sort_by\x18\x05 \x01(\x0e\x32\x07.SortBy\x12\x12\n\ndescending\x18\x06 \x01(\x08\x12\r\n\x05limit\x18\x07 \x01(\x05\"5\n\x12SearchItemResponse\x12\x0f\n\x07message\x18\x01 \x01(\t\x12\x0e\n\x06status\x18\x02 \x01(\t\"\xa7\x01\n\x07Product\x12\x0b\n\x03_id\x18\x01 \x01(\x05\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\r\n\x05price\x18\x03 \x01(\x01\x12\x10\n\x08quantity\x18\x04 \x01(\x05\x12\x13\n\x0b\x64\x65scription\x18\x05 \x01(\t\x12\x16\n\x0eseller_ip_port\x18\x06 \x01(\t\x12\x10\n\x08\x63\x61tegory\x18\x07 \x01(\t\x12\x0e\n\x06rating\x18\x08 \x01(\x01\x12\x11\n\tn_ratings\x18\t \x01(\x05\"\xd5\x01\n\x17SearchItemStreamRequest\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x10\n\x08\x63\x61tegory\x18\x02 \x01(\t\x12\x11\n\tpage_size\x18\x03 \x01(\x05\x12\x0e\n\x06\x63ursor\x18\x04 \x01(\x05\x12\x19\n\x05match\x18\x05 \x01(\x0e\x32\n.MatchMode\x12\x1f\n\x07\x66ilters\x18\x06 \x01(\x0b\x32\x0e.SearchFilters\x12\x18\n\x07sort_by\x18\x07 \x01(\x0e\x32\x07.SortBy\x12\x12\n\ndescending\x18\x08 \x01(\x08\x12\r\n\x05limit\x18\t \x01(\x05\"Q\n\x0eSearchItemPage\x12\x1a\n\x08products\x18\x01 \x03(\x0b\x32\x08.Product\x12\x13\n\x0bnext_cursor\x18\x02 \x01(\x05\x12\x0e\n\x06status\x18\x03 \x01(\t\"E\n\x0fRateItemRequest\x12\x0b\n\x03_id\x18\x01 \x01(\x05\x12\x15\n\rbuyer_ip_port\x18\x02 \x01(\t\x12\x0e\n\x06rating\x18\x03 \x01(\x05\"3\n\x10RateItemResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\"5\n\x0fWishlistRequest\x12\x15\n\rbuyer_ip_port\x18\x01 \x01(\t\x12\x0b\n\x03_id\x18\x02 \x01(\x05\"3\n\x10WishlistResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\":\n\nItemStatus\x12\x0b\n\x03_id\x18\x01 \x01(\x05\x12\x0e\n\x06status\x18\x02 \x01(\t\x12\x0f\n\x07message\x18\x03 \x01(\t\"N\n\rBatchResponse\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x1c\n\x07results\x18\x03 \x03(\x0b\x32\x0b.ItemStatus\"e\n\rSellItemEntry\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\r\n\x05price\x18\x02 \x01(\x02\x12\x10\n\x08quantity\x18\x03 \x01(\x05\x12\x13\n\x0b\x64\x65scription\x18\x04 \x01(\t\x12\x10\n\x08\x63\x61tegory\x18\x05 \x01(\t\"P\n\x10SellItemsRequest\x12\x0f\n\x07ip_port\x18\x01 \x01(\t\x12\x0c\n\x04uuid\x18\x02 \x01(\t\x12\x1d\n\x05items\x18\x03 \x03(\x0b\x32\x0e.SellItemEntry\"G\n\x0fUpdateItemEntry\x12\x0b\n\x03_id\x18\x01 \x01(\x05\x12\x11\n\tnew_price\x18\x02 \x01(\x01\x12\x14\n\x0cnew_quantity\x18\x03 \x01(\x05\"T\n\x12UpdateItemsRequest\x12\x0f\n\x07ip_port\x18\x01 \x01(\t\x12\x0c\n\x04uuid\x18\x02 \x01(\t\x12\x1f\n\x05items\x18\x03 \x03(\x0b\x32\x10.UpdateItemEntry\"-\n\x0c\x42uyItemEntry\x12\x0b\n\x03_id\x18\x01 \x01(\x05\x12\x10\n\x08quantity\x18\x02 \x01(\x05\"@\n\x0f\x42uyItemsRequest\x12\x0f\n\x07ip_port\x18\x01 \x01(\t\x12\x1c\n\x05items\x18\x02 \x03(\x0b\x32\r.BuyItemEntry\"1\n\rFollowRequest\x12\x11\n\tafter_seq\x18\x01 \x01(\x03\x12\r\n\x05\x65poch\x18\x02 \x01(\t\"m\n\x06\x43hange\x12\x0b\n\x03seq\x18\x01 \x01(\x03\x12\x0e\n\x06method\x18\x02 \x01(\t\x12\x0f\n\x07request\x18\x03 \x01(\x0c\x12\x10\n\x08snapshot\x18\x04 \x01(\t\x12\r\n\x05\x65poch\x18\x05 \x01(\t\x12\x14\n\x0csnapshot_end\x18\x06 \x01(\x08*1\n\tMatchMode\x12\t\n\x05\x45XACT\x10\x00\x12\n\n\x06PREFIX\x10\x01\x12\r\n\tSUBSTRING\x10\x02*C\n\x06SortBy\x12\x06\n\x02ID\x10\x00\x12\t\n\x05PRICE\x10\x01\x12\n\n\x06RATING\x10\x02\x12\r\n\tN_RATINGS\x10\x03\x12\x0b\n\x07RECENCY\x10\x04\x32\x8f\x06\n\x0bMarketplace\x12\x41\n\x0eRegisterSeller\x12\x16.RegisterSellerRequest\x1a\x17.RegisterSellerResponse\x12\x35\n\nDeleteItem\x12\x12.DeleteItemRequest\x1a\x13.DeleteItemResponse\x12M\n\x12\x44isplaySellerItems\x12\x1a.DisplaySellerItemsRequest\x1a\x1b.DisplaySellerItemsResponse\x12/\n\x08SellItem\x12\x10.SellItemRequest\x1a\x11.SellItemResponse\x12\x35\n\nSearchItem\x12\x12.SearchItemRequest\x1a\x13.SearchItemResponse\x12?\n\x10SearchItemStream\x12\x18.SearchItemStreamRequest\x1a\x0f.SearchItemPage0\x01\x12/\n\x08RateItem\x12\x10.RateItemRequest\x1a\x11.RateItemResponse\x12\x35\n\x0cWishlistItem\x12\x10.WishlistRequest\x1a\x11.WishlistResponse\"\x00\x12\x35\n\nUpdateItem\x12\x12.UpdateItemRequest\x1a\x13.UpdateItemResponse\x12,\n\x07\x42uyItem\x12\x0f.BuyItemRequest\x1a\x10.BuyItemResponse\x12/\n\tSubscribe\x12\x11.SubscribeRequest\x1a\r.Notification0\x01\x12.\n\tSellItems\x12\x11.SellItemsRequest\x1a\x0e.BatchResponse\x12\x32\n\x0bUpdateItems\x12\x13.UpdateItemsRequest\x1a\x0e.BatchResponse\x12,\n\x08\x42uyItems\x12\x10.BuyItemsRequest\x1a\x0e.BatchResponse2O\n\x0cnotification\x12?\n\x10SendNotification\x12\x14.NotificationRequest\x1a\x15.NotificationResponse22\n\x0bReplication\x12#\n\x06\x46ollow\x12\x0e.FollowRequest\x1a\x07.Change0\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'marketplace_pb2', _globals)
 if _descriptor._USE_C_DESCRIPTORS == False:
   DESCRIPTOR._options = None
+  _globals['_MATCHMODE']._serialized_start=2886
+  _globals['_MATCHMODE']._serialized_end=2935
+  _globals['_SORTBY']._serialized_start=2937
+  _globals['_SORTBY']._serialized_end=3004
   _globals['_NOTIFICATIONRESPONSE']._serialized_start=21
   _globals['_NOTIFICATIONRESPONSE']._serialized_end=61
   _globals['_NOTIFICATIONREQUEST']._serialized_start=63
   _globals['_NOTIFICATIONREQUEST']._serialized_end=101
-  _globals['_UPDATEITEMREQUEST']._serialized_start=103
-  _globals['_UPDATEITEMREQUEST']._serialized_end=207
-  _globals['_UPDATEITEMRESPONSE']._serialized_start=209
-  _globals['_UPDATEITEMRESPONSE']._serialized_end=263
-  _globals['_BUYITEMREQUEST']._serialized_start=265
-  _globals['_BUYITEMREQUEST']._serialized_end=329
-  _globals['_BUYITEMRESPONSE']._serialized_start=331
-  _globals['_BUYITEMRESPONSE']._serialized_end=364
-  _globals['_REGISTERSELLERREQUEST']._serialized_start=366
-  _globals['_REGISTERSELLERREQUEST']._serialized_end=420
-  _globals['_REGISTERSELLERRESPONSE']._serialized_start=422
-  _globals['_REGISTERSELLERRESPONSE']._serialized_end=479
-  _globals['_DELETEITEMREQUEST']._serialized_start=481
-  _globals['_DELETEITEMREQUEST']._serialized_end=544
-  _globals['_DELETEITEMRESPONSE']._serialized_start=546
-  _globals['_DELETEITEMRESPONSE']._serialized_end=599
-  _globals['_DISPLAYSELLERITEMSREQUEST']._serialized_start=601
-  _globals['_DISPLAYSELLERITEMSREQUEST']._serialized_end=659
-  _globals['_DISPLAYSELLERITEMSRESPONSE']._serialized_start=661
-  _globals['_DISPLAYSELLERITEMSRESPONSE']._serialized_end=721
-  _globals['_SELLITEMREQUEST']._serialized_start=724
-  _globals['_SELLITEMREQUEST']._serialized_end=858
-  _globals['_SELLITEMRESPONSE']._serialized_start=860
-  _globals['_SELLITEMRESPONSE']._serialized_end=911
-  _globals['_SEARCHITEMREQUEST']._serialized_start=913
-  _globals['_SEARCHITEMREQUEST']._serialized_end=964
-  _globals['_SEARCHITEMRESPONSE']._serialized_start=966
-  _globals['_SEARCHITEMRESPONSE']._serialized_end=1019
-  _globals['_RATEITEMREQUEST']._serialized_start=1021
-  _globals['_RATEITEMREQUEST']._serialized_end=1090
-  _globals['_RATEITEMRESPONSE']._serialized_start=1092
-  _globals['_RATEITEMRESPONSE']._serialized_end=1143
-  _globals['_WISHLISTREQUEST']._serialized_start=1145
-  _globals['_WISHLISTREQUEST']._serialized_end=1198
-  _globals['_WISHLISTRESPONSE']._serialized_start=1200
-  _globals['_WISHLISTRESPONSE']._serialized_end=1251
-  _globals['_MARKETPLACE']._serialized_start=1254
-  _globals['_MARKETPLACE']._serialized_end=1777
-  _globals['_NOTIFICATION']._serialized_start=1779
-  _globals['_NOTIFICATION']._serialized_end=1858
+  _globals['_SUBSCRIBEREQUEST']._serialized_start=103
+  _globals['_SUBSCRIBEREQUEST']._serialized_end=162
+  _globals['_NOTIFICATION']._serialized_start=164
+  _globals['_NOTIFICATION']._serialized_end=212
+  _globals['_UPDATEITEMREQUEST']._serialized_start=214
+  _globals['_UPDATEITEMREQUEST']._serialized_end=318
+  _globals['_UPDATEITEMRESPONSE']._serialized_start=320
+  _globals['_UPDATEITEMRESPONSE']._serialized_end=374
+  _globals['_BUYITEMREQUEST']._serialized_start=376
+  _globals['_BUYITEMREQUEST']._serialized_end=460
+  _globals['_BUYITEMRESPONSE']._serialized_start=462
+  _globals['_BUYITEMRESPONSE']._serialized_end=495
+  _globals['_REGISTERSELLERREQUEST']._serialized_start=497
+  _globals['_REGISTERSELLERREQUEST']._serialized_end=551
+  _globals['_REGISTERSELLERRESPONSE']._serialized_start=553
+  _globals['_REGISTERSELLERRESPONSE']._serialized_end=610
+  _globals['_DELETEITEMREQUEST']._serialized_start=612
+  _globals['_DELETEITEMREQUEST']._serialized_end=675
+  _globals['_DELETEITEMRESPONSE']._serialized_start=677
+  _globals['_DELETEITEMRESPONSE']._serialized_end=730
+  _globals['_DISPLAYSELLERITEMSREQUEST']._serialized_start=732
+  _globals['_DISPLAYSELLERITEMSREQUEST']._serialized_end=790
+  _globals['_DISPLAYSELLERITEMSRESPONSE']._serialized_start=792
+  _globals['_DISPLAYSELLERITEMSRESPONSE']._serialized_end=852
+  _globals['_SELLITEMREQUEST']._serialized_start=855
+  _globals['_SELLITEMREQUEST']._serialized_end=989
+  _globals['_SELLITEMRESPONSE']._serialized_start=991
+  _globals['_SELLITEMRESPONSE']._serialized_end=1042
+  _globals['_SEARCHFILTERS']._serialized_start=1045
+  _globals['_SEARCHFILTERS']._serialized_end=1194
+  _globals['_SEARCHITEMREQUEST']._serialized_start=1197
+  _globals['_SEARCHITEMREQUEST']._serialized_end=1369
+  _globals['_SEARCHITEMRESPONSE']._serialized_start=1371
+  _globals['_SEARCHITEMRESPONSE']._serialized_end=1424
+  _globals['_PRODUCT']._serialized_start=1427
+  _globals['_PRODUCT']._serialized_end=1594
+  _globals['_SEARCHITEMSTREAMREQUEST']._serialized_start=1597
+  _globals['_SEARCHITEMSTREAMREQUEST']._serialized_end=1810
+  _globals['_SEARCHITEMPAGE']._serialized_start=1812
+  _globals['_SEARCHITEMPAGE']._serialized_end=1893
+  _globals['_RATEITEMREQUEST']._serialized_start=1895
+  _globals['_RATEITEMREQUEST']._serialized_end=1964
+  _globals['_RATEITEMRESPONSE']._serialized_start=1966
+  _globals['_RATEITEMRESPONSE']._serialized_end=2017
+  _globals['_WISHLISTREQUEST']._serialized_start=2019
+  _globals['_WISHLISTREQUEST']._serialized_end=2072
+  _globals['_WISHLISTRESPONSE']._serialized_start=2074
+  _globals['_WISHLISTRESPONSE']._serialized_end=2125
+  _globals['_ITEMSTATUS']._serialized_start=2127
+  _globals['_ITEMSTATUS']._serialized_end=2185
+  _globals['_BATCHRESPONSE']._serialized_start=2187
+  _globals['_BATCHRESPONSE']._serialized_end=2265
+  _globals['_SELLITEMENTRY']._serialized_start=2267
+  _globals['_SELLITEMENTRY']._serialized_end=2368
+  _globals['_SELLITEMSREQUEST']._serialized_start=2370
+  _globals['_SELLITEMSREQUEST']._serialized_end=2450
+  _globals['_UPDATEITEMENTRY']._serialized_start=2452
+  _globals['_UPDATEITEMENTRY']._serialized_end=2523
+  _globals['_UPDATEITEMSREQUEST']._serialized_start=2525
+  _globals['_UPDATEITEMSREQUEST']._serialized_end=2609
+  _globals['_BUYITEMENTRY']._serialized_start=2611
+  _globals['_BUYITEMENTRY']._serialized_end=2656
+  _globals['_BUYITEMSREQUEST']._serialized_start=2658
+  _globals['_BUYITEMSREQUEST']._serialized_end=2722
+  _globals['_FOLLOWREQUEST']._serialized_start=2724
+  _globals['_FOLLOWREQUEST']._serialized_end=2773
+  _globals['_CHANGE']._serialized_start=2775
+  _globals['_CHANGE']._serialized_end=2884
+  _globals['_MARKETPLACE']._serialized_start=3007
+  _globals['_MARKETPLACE']._serialized_end=3790
+  _globals['_NOTIFICATION']._serialized_start=3792
+  _globals['_NOTIFICATION']._serialized_end=3871
+  _globals['_REPLICATION']._serialized_start=3873
+  _globals['_REPLICATION']._serialized_end=3923
 # @@protoc_insertion_point(module_scope)
@@ -11,6 +11,8 @@ class MarketplaceStub(object):
     and that notification is basically sent through BuyItem.
     In a similar vein we have AddToWishList that should make buyers stream for notifications
     on that product, notifications being sent on a UpdateItem call by a seller.
+    Both stream them through Subscribe. The notification service of clients that are
+    not subscribed is only dialed back by servers started with --notify-dial-back.
 
     """
 
@@ -45,6 +47,11 @@ class MarketplaceStub(object):
                 request_serializer=marketplace__pb2.SearchItemRequest.SerializeToString,
                 response_deserializer=marketplace__pb2.SearchItemResponse.FromString,
                 )
+        self.SearchItemStream = channel.unary_stream(
+                '/Marketplace/SearchItemStream',
+                request_serializer=marketplace__pb2.SearchItemStreamRequest.SerializeToString,
+                response_deserializer=marketplace__pb2.SearchItemPage.FromString,
+                )
         self.RateItem = channel.unary_unary(
                 '/Marketplace/RateItem',
                 request_serializer=marketplace__pb2.RateItemRequest.SerializeToString,
@@ -65,6 +72,26 @@ class MarketplaceStub(object):
                 request_serializer=marketplace__pb2.BuyItemRequest.SerializeToString,
                 response_deserializer=marketplace__pb2.BuyItemResponse.FromString,
                 )
+        self.Subscribe = channel.unary_stream(
+                '/Marketplace/Subscribe',
+                request_serializer=marketplace__pb2.SubscribeRequest.SerializeToString,
+                response_deserializer=marketplace__pb2.Notification.FromString,
+                )
+        self.SellItems = channel.unary_unary(
+                '/Marketplace/SellItems',
+                request_serializer=marketplace__pb2.SellItemsRequest.SerializeToString,
+                response_deserializer=marketplace__pb2.BatchResponse.FromString,
+                )
+        self.UpdateItems = channel.unary_unary(
+                '/Marketplace/UpdateItems',
+                request_serializer=marketplace__pb2.UpdateItemsRequest.SerializeToString,
+                response_deserializer=marketplace__pb2.BatchResponse.FromString,
+                )
+        self.BuyItems = channel.unary_unary(
+                '/Marketplace/BuyItems',
+                request_serializer=marketplace__pb2.BuyItemsRequest.SerializeToString,
+                response_deserializer=marketplace__pb2.BatchResponse.FromString,
+                )
 
 
 class MarketplaceServicer(object):
@@ -73,6 +100,8 @@ class MarketplaceServicer(object):
     and that notification is basically sent through BuyItem.
     In a similar vein we have AddToWishList that should make buyers stream for notifications
     on that product, notifications being sent on a UpdateItem call by a seller.
+    Both stream them through Subscribe. The notification service of clients that are
+    not subscribed is only dialed back by servers started with --notify-dial-back.
 
     """
 
@@ -106,6 +135,12 @@ class MarketplaceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def SearchItemStream(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def RateItem(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -130,6 +165,30 @@ class MarketplaceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def Subscribe(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SellItems(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def UpdateItems(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BuyItems(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_MarketplaceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -158,6 +217,11 @@ def add_MarketplaceServicer_to_server(servicer, server):
                     request_deserializer=marketplace__pb2.SearchItemRequest.FromString,
                     response_serializer=marketplace__pb2.SearchItemResponse.SerializeToString,
             ),
+            'SearchItemStream': grpc.unary_stream_rpc_method_handler(
+                    servicer.SearchItemStream,
+                    request_deserializer=marketplace__pb2.SearchItemStreamRequest.FromString,
+                    response_serializer=marketplace__pb2.SearchItemPage.SerializeToString,
+            ),
             'RateItem': grpc.unary_unary_rpc_method_handler(
                     servicer.RateItem,
                     request_deserializer=marketplace__pb2.RateItemRequest.FromString,
@@ -178,6 +242,26 @@ def add_MarketplaceServicer_to_server(servicer, server):
                     request_deserializer=marketplace__pb2.BuyItemRequest.FromString,
                     response_serializer=marketplace__pb2.BuyItemResponse.SerializeToString,
             ),
+            'Subscribe': grpc.unary_stream_rpc_method_handler(
+                    servicer.Subscribe,
+                    request_deserializer=marketplace__pb2.SubscribeRequest.FromString,
+                    response_serializer=marketplace__pb2.Notification.SerializeToString,
+            ),
+            'SellItems': grpc.unary_unary_rpc_method_handler(
+                    servicer.SellItems,
+                    request_deserializer=marketplace__pb2.SellItemsRequest.FromString,
+                    response_serializer=marketplace__pb2.BatchResponse.SerializeToString,
+            ),
+            'UpdateItems': grpc.unary_unary_rpc_method_handler(
+                    servicer.UpdateItems,
+                    request_deserializer=marketplace__pb2.UpdateItemsRequest.FromString,
+                    response_serializer=marketplace__pb2.BatchResponse.SerializeToString,
+            ),
+            'BuyItems': grpc.unary_unary_rpc_method_handler(
+                    servicer.BuyItems,
+                    request_deserializer=marketplace__pb2.BuyItemsRequest.FromString,
+                    response_serializer=marketplace__pb2.BatchResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'Marketplace', rpc_method_handlers)
@@ -191,6 +275,8 @@ class Marketplace(object):
     and that notification is basically sent through BuyItem.
     In a similar vein we have AddToWishList that should make buyers stream for notifications
     on that product, notifications being sent on a UpdateItem call by a seller.
+    Both stream them through Subscribe. The notification service of clients that are
+    not subscribed is only dialed back by servers started with --notify-dial-back.
 
     """
 
@@ -279,6 +365,23 @@ class Marketplace(object):
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
 
+    @staticmethod
+    def SearchItemStream(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(request, target, '/Marketplace/SearchItemStream',
+            marketplace__pb2.SearchItemStreamRequest.SerializeToString,
+            marketplace__pb2.SearchItemPage.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
     @staticmethod
     def RateItem(request,
             target,
@@ -347,6 +450,74 @@ class Marketplace(object):
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
 
+    @staticmethod
+    def Subscribe(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(request, target, '/Marketplace/Subscribe',
+            marketplace__pb2.SubscribeRequest.SerializeToString,
+            marketplace__pb2.Notification.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def SellItems(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/Marketplace/SellItems',
+            marketplace__pb2.SellItemsRequest.SerializeToString,
+            marketplace__pb2.BatchResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def UpdateItems(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/Marketplace/UpdateItems',
+            marketplace__pb2.UpdateItemsRequest.SerializeToString,
+            marketplace__pb2.BatchResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def BuyItems(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/Marketplace/BuyItems',
+            marketplace__pb2.BuyItemsRequest.SerializeToString,
+            marketplace__pb2.BatchResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
 
 class notificationStub(object):
     """Missing associated documentation comment in .proto file."""
@@ -407,3 +578,67 @@ class notification(object):
             marketplace__pb2.NotificationResponse.FromString,
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+
+class ReplicationStub(object):
+    """served by a primary started with --primary, followed by read replicas
+    """
+
+    def __init__(self, channel):
+        """Constructor.
+
+        Args:
+            channel: A grpc.Channel.
+        """
+        self.Follow = channel.unary_stream(
+                '/Replication/Follow',
+                request_serializer=marketplace__pb2.FollowRequest.SerializeToString,
+                response_deserializer=marketplace__pb2.Change.FromString,
+                )
+
+
+class ReplicationServicer(object):
+    """served by a primary started with --primary, followed by read replicas
+    """
+
+    def Follow(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+
+def add_ReplicationServicer_to_server(servicer, server):
+    rpc_method_handlers = {
+            'Follow': grpc.unary_stream_rpc_method_handler(
+                    servicer.Follow,
+                    request_deserializer=marketplace__pb2.FollowRequest.FromString,
+                    response_serializer=marketplace__pb2.Change.SerializeToString,
+            ),
+    }
+    generic_handler = grpc.method_handlers_generic_handler(
+            'Replication', rpc_method_handlers)
+    server.add_generic_rpc_handlers((generic_handler,))
+
+
+ # This class is part of an EXPERIMENTAL API.
+class Replication(object):
+    """served by a primary started with --primary, followed by read replicas
+    """
+
+    @staticmethod
+    def Follow(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(request, target, '/Replication/Follow',
+            marketplace__pb2.FollowRequest.SerializeToString,
+            marketplace__pb2.Change.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
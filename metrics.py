@@ -0,0 +1,276 @@
+import asyncio
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import grpc
+
+# upper bounds of the latency buckets in seconds, 100us doubling up to ~13s
+LATENCY_BUCKETS = tuple(0.0001 * 2 ** i for i in range(18))
+
+
+class Histogram:
+    """Counts of observations per bucket, plus their sum, Prometheus style."""
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket the q-quantile falls in, None without observations."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+class MethodStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.outcomes = dict()  # status -> calls
+        self.latency = Histogram()
+        self.in_flight = 0
+
+
+class Metrics:
+    """
+    Per-method call counts by outcome, latency histograms and in-flight gauges, filled
+    in by MetricsInterceptor, plus gauges read on demand (catalog size and the like).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._methods = dict()
+        self._gauges = dict()
+
+    def method(self, name):
+        stats = self._methods.get(name)
+        if stats is None:
+            with self._lock:
+                stats = self._methods.setdefault(name, MethodStats())
+        return stats
+
+    def started(self, name):
+        stats = self.method(name)
+        with stats.lock:
+            stats.in_flight += 1
+        return stats
+
+    @staticmethod
+    def finished(stats, status, seconds):
+        with stats.lock:
+            stats.in_flight -= 1
+            stats.outcomes[status] = stats.outcomes.get(status, 0) + 1
+            stats.latency.observe(seconds)
+
+    def gauge(self, name, read):
+        """Registers read() as the current value of the gauge name."""
+        self._gauges[name] = read
+
+    def track_service(self, service):
+        self.gauge('marketplace_products', lambda: len(service.product_id_to_product))
+        self.gauge('marketplace_sellers', lambda: len(service.sellers))
+        self.gauge('marketplace_wishlisting_buyers', lambda: len(service.wishlist))
+        self.gauge('marketplace_subscriptions', lambda: len(service.subscriptions))
+        self.gauge('marketplace_search_cache_hits', lambda: service.search_results.hits)
+        self.gauge('marketplace_search_cache_misses', lambda: service.search_results.misses)
+        if service.notifier is not None:
+            self.gauge('marketplace_notifications_dropped', lambda: service.notifier.dropped)
+
+    def render(self):
+        """Everything in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            methods = sorted(self._methods.items())
+        for name, stats in methods:
+            with stats.lock:
+                outcomes = sorted(stats.outcomes.items())
+                in_flight = stats.in_flight
+                counts, total, count = list(stats.latency.counts), stats.latency.sum, stats.latency.count
+                bounds = stats.latency.bounds
+            label = f'method="{name}"'
+            for status, calls in outcomes:
+                lines.append(f'marketplace_rpc_total{{{label},status="{status}"}} {calls}')
+            lines.append(f'marketplace_rpc_in_flight{{{label}}} {in_flight}')
+            cumulative = 0
+            for bound, bucket in zip(bounds + (float('inf'),), counts):
+                cumulative += bucket
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                lines.append(f'marketplace_rpc_latency_seconds_bucket{{{label},le="{le}"}} {cumulative}')
+            lines.append(f'marketplace_rpc_latency_seconds_sum{{{label}}} {total}')
+            lines.append(f'marketplace_rpc_latency_seconds_count{{{label}}} {count}')
+        for name, read in sorted(self._gauges.items()):
+            lines.append(f'{name} {read()}')
+        return '\n'.join(lines) + '\n'
+
+
+def _status(response):
+    # the marketplace reports refusals as status="FAIL" in an OK response
+    return getattr(response, 'status', None) or 'OK'
+
+
+def _error_status(context):
+    # the code a handler or another interceptor aborted with, e.g. RESOURCE_EXHAUSTED
+    code = context.code() if hasattr(context, 'code') else None
+    return code.name if isinstance(code, grpc.StatusCode) else 'ERROR'
+
+
+def _method_name(handler_call_details):
+    return handler_call_details.method.rsplit('/', 1)[-1]
+
+
+def _instrumented(handler, name, metrics):
+    if handler.unary_unary is not None:
+        behavior = handler.unary_unary
+
+        def unary_unary(request, context):
+            stats, started = metrics.started(name), time.perf_counter()
+            status = 'ERROR'
+            try:
+                response = behavior(request, context)
+                status = _status(response)
+                return response
+            except Exception:
+                status = _error_status(context)
+                raise
+            finally:
+                metrics.finished(stats, status, time.perf_counter() - started)
+
+        return grpc.unary_unary_rpc_method_handler(
+            unary_unary, handler.request_deserializer, handler.response_serializer)
+
+    if handler.unary_stream is not None:
+        behavior = handler.unary_stream
+
+        def unary_stream(request, context):
+            # a stream is timed until its last message was handed over
+            stats, started = metrics.started(name), time.perf_counter()
+            status = 'ERROR'
+            try:
+                response = None
+                for response in behavior(request, context):
+                    yield response
+                status = _status(response)
+            except GeneratorExit:
+                status = 'CANCELLED'
+                raise
+            except Exception:
+                status = _error_status(context)
+                raise
+            finally:
+                metrics.finished(stats, status, time.perf_counter() - started)
+
+        return grpc.unary_stream_rpc_method_handler(
+            unary_stream, handler.request_deserializer, handler.response_serializer)
+
+    # the marketplace has no client streaming methods
+    return handler
+
+
+def _instrumented_aio(handler, name, metrics):
+    if handler.unary_unary is not None:
+        behavior = handler.unary_unary
+
+        async def unary_unary(request, context):
+            stats, started = metrics.started(name), time.perf_counter()
+            status = 'ERROR'
+            try:
+                response = await behavior(request, context)
+                status = _status(response)
+                return response
+            except asyncio.CancelledError:
+                # a BaseException, raised into the handler when the client goes away
+                status = 'CANCELLED'
+                raise
+            except Exception:
+                status = _error_status(context)
+                raise
+            finally:
+                metrics.finished(stats, status, time.perf_counter() - started)
+
+        return grpc.unary_unary_rpc_method_handler(
+            unary_unary, handler.request_deserializer, handler.response_serializer)
+
+    if handler.unary_stream is not None:
+        behavior = handler.unary_stream
+
+        async def unary_stream(request, context):
+            stats, started = metrics.started(name), time.perf_counter()
+            status = 'ERROR'
+            try:
+                response = None
+                async for response in behavior(request, context):
+                    yield response
+                status = _status(response)
+            except (GeneratorExit, asyncio.CancelledError):
+                status = 'CANCELLED'
+                raise
+            except Exception:
+                status = _error_status(context)
+                raise
+            finally:
+                metrics.finished(stats, status, time.perf_counter() - started)
+
+        return grpc.unary_stream_rpc_method_handler(
+            unary_stream, handler.request_deserializer, handler.response_serializer)
+
+    return handler
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    """Times and counts every RPC of a grpc.server into metrics."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        return _instrumented(handler, _method_name(handler_call_details), self.metrics)
+
+
+class AsyncMetricsInterceptor(grpc.aio.ServerInterceptor):
+    """MetricsInterceptor for grpc.aio servers."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        return _instrumented_aio(handler, _method_name(handler_call_details), self.metrics)
+
+
+def serve_metrics(metrics, port):
+    """Serves metrics.render() over HTTP on port from a background thread."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('', port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
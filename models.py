@@ -1,24 +1,57 @@
+from operator import attrgetter
+
+
 class Seller:
+    """
+    A seller's identity, looked up on every seller RPC. Read-only, so its hash is
+    computed once.
+    """
+    __slots__ = ('_ip_port', '_uuid', '_hash')
+
     def __init__(self, ip_port, uuid):
-        self.ip_port = ip_port
-        self.uuid = uuid
+        self._ip_port = ip_port
+        self._uuid = uuid
+        self._hash = hash((ip_port, uuid))
+
+    ip_port = property(attrgetter('_ip_port'))
+    uuid = property(attrgetter('_uuid'))
+
+    def __getnewargs__(self):
+        return self._ip_port, self._uuid
 
     def __hash__(self):
-        return hash((self.ip_port, self.uuid))
+        return self._hash
 
     def __eq__(self, other):
-        return (self.ip_port, self.uuid) == (other.ip_port, other.uuid)
+        if self is other:
+            return True
+        if not isinstance(other, Seller):
+            return NotImplemented
+        return self._hash == other._hash and self._ip_port == other._ip_port and self._uuid == other._uuid
 
 
 class Buyer:
-    def __init__(self, ip_port):
-        self.ip_port: str = ip_port
+    """A buyer's identity, read-only like Seller."""
+    __slots__ = ('_ip_port', '_hash')
+
+    def __init__(self, ip_port: str):
+        self._ip_port = ip_port
+        self._hash = hash(ip_port)
+
+    ip_port = property(attrgetter('_ip_port'))
+
+    def __getnewargs__(self):
+        return self._ip_port,
 
     def __hash__(self):
-        return hash(self.ip_port)
+        return self._hash
 
     def __eq__(self, other):
-        return self.ip_port == other.ip_port
+        if self is other:
+            return True
+        if not isinstance(other, Buyer):
+            return NotImplemented
+        return self._hash == other._hash and self._ip_port == other._ip_port
 
 
 class Product:
@@ -0,0 +1,222 @@
+import heapq
+import itertools
+import logging
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import grpc
+
+import marketplace_pb2
+import marketplace_pb2_grpc
+from structured_logging import fields
+
+RETRYABLE_CODES = {
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+}
+SUBSCRIPTION_QUEUE_SIZE = 1000
+# how often an idle Subscribe stream checks that its client is still there
+SUBSCRIPTION_POLL_INTERVAL = 1
+
+logger = logging.getLogger('marketplace.notifications')
+
+
+class Subscription:
+    """
+    Notifications waiting for one Subscribe stream, dropped once the client falls too far
+    behind. The address None subscribes to the notifications of every recipient.
+    """
+
+    def __init__(self, address, max_queue=SUBSCRIPTION_QUEUE_SIZE):
+        self.address = address
+        self.queue = queue.Queue(maxsize=max_queue)
+
+    def deliver(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            logger.warning("Subscriber is not keeping up, dropped a notification", extra=fields(address=self.address))
+
+    def get(self, timeout):
+        return self.queue.get(timeout=timeout)
+
+
+class SubscriptionHub:
+    """The live Subscribe streams, by the address the client identifies itself with."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = dict()
+
+    def add(self, subscription):
+        with self._lock:
+            self._subscriptions.setdefault(subscription.address, set()).add(subscription)
+        return subscription
+
+    def remove(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.address)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.address]
+
+    def publish(self, address, message):
+        """Hands message to every stream of address and of every recipient, False if there are none."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(address, ())) + list(self._subscriptions.get(None, ()))
+        if subscriptions:
+            notification = marketplace_pb2.Notification(message=message, ip_port=address)
+            for subscription in subscriptions:
+                subscription.deliver(notification)
+        return bool(subscriptions)
+
+    def stream(self, request, context, poll_interval=SUBSCRIPTION_POLL_INTERVAL):
+        """The notifications for a SubscribeRequest, for as long as its client is there."""
+        subscription = self.add(Subscription(None if request.all_recipients else request.ip_port))
+        try:
+            while context.is_active():
+                try:
+                    yield subscription.get(poll_interval)
+                except queue.Empty:
+                    continue
+        finally:
+            self.remove(subscription)
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+class ChannelPool:
+    """Keeps one channel and notification stub per client address, closing the least recently used."""
+
+    def __init__(self, max_channels=256):
+        self.max_channels = max_channels
+        self._lock = threading.Lock()
+        self._channels = OrderedDict()
+
+    def stub(self, address):
+        with self._lock:
+            entry = self._channels.get(address)
+            if entry is not None:
+                self._channels.move_to_end(address)
+                return entry[1]
+
+            channel = grpc.insecure_channel(address)
+            stub = marketplace_pb2_grpc.notificationStub(channel)
+            self._channels[address] = (channel, stub)
+            if len(self._channels) > self.max_channels:
+                _, (old_channel, _) = self._channels.popitem(last=False)
+                old_channel.close()
+            return stub
+
+    def close(self):
+        with self._lock:
+            for channel, _ in self._channels.values():
+                channel.close()
+            self._channels.clear()
+
+
+class NotificationDispatcher:
+    """
+    Delivers notifications to the clients' notification servers from background
+    threads, so the RPC that caused them never waits on the network.
+
+    notify() only enqueues. Workers drain the queue in batches and send one request
+    per recipient with all of its pending messages, retrying failed sends with
+    exponential backoff. When the queue is full new notifications are dropped.
+    """
+
+    def __init__(self, max_queue=10000, n_workers=4, max_batch=64, max_retries=3,
+                 backoff=0.2, timeout=2.0, channels=None):
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.channels = channels or ChannelPool()
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._retries = []  # heap of (due time, seq, address, messages, attempt)
+        self._retries_lock = threading.Lock()
+        self._seq = itertools.count()
+        self._stopped = threading.Event()
+        self._workers = [threading.Thread(target=self._run, name=f'notifier-{i}', daemon=True)
+                         for i in range(n_workers)]
+        self.dropped = 0
+
+    def start(self):
+        for worker in self._workers:
+            worker.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        for worker in self._workers:
+            worker.join()
+        self.channels.close()
+
+    def notify(self, address, message):
+        try:
+            self._queue.put_nowait((address, message))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("Notification queue full, dropped a notification", extra=fields(address=address))
+            return False
+
+    def _due_retry(self):
+        with self._retries_lock:
+            if self._retries and self._retries[0][0] <= time.monotonic():
+                return heapq.heappop(self._retries)
+            return None
+
+    def _next_wait(self):
+        with self._retries_lock:
+            if self._retries:
+                return max(0.0, min(self._retries[0][0] - time.monotonic(), 0.5))
+        return 0.5
+
+    def _run(self):
+        while not self._stopped.is_set():
+            retry = self._due_retry()
+            if retry is not None:
+                _, _, address, messages, attempt = retry
+                self._send(address, messages, attempt)
+                continue
+
+            try:
+                first = self._queue.get(timeout=self._next_wait())
+            except queue.Empty:
+                continue
+
+            # group whatever else is already waiting by recipient
+            batch = OrderedDict()
+            batch.setdefault(first[0], []).append(first[1])
+            for _ in range(self.max_batch - 1):
+                try:
+                    address, message = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.setdefault(address, []).append(message)
+
+            for address, messages in batch.items():
+                self._send(address, messages, 0)
+
+    def _send(self, address, messages, attempt):
+        request = marketplace_pb2.NotificationRequest(request="\n".join(messages))
+        try:
+            self.channels.stub(address).SendNotification(request, timeout=self.timeout)
+        except grpc.RpcError as error:
+            if error.code() not in RETRYABLE_CODES or attempt >= self.max_retries:
+                logger.warning("Notification failed", extra=fields(address=address, attempts=attempt + 1,
+                                                                    code=error.code().name))
+                return
+            delay = self.backoff * (2 ** attempt) * (1 + random.random())
+            with self._retries_lock:
+                heapq.heappush(self._retries,
+                               (time.monotonic() + delay, next(self._seq), address, messages, attempt + 1))
@@ -0,0 +1,227 @@
+import base64
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+import marketplace_pb2
+from structured_logging import quiet
+
+SNAPSHOT_FILE = 'snapshot.json'
+SNAPSHOT_INTERVAL = 300
+SNAPSHOT_EVERY_N_RECORDS = 100000
+
+logger = logging.getLogger('marketplace.persistence')
+
+# the mutating RPCs and the request type each of them is logged with
+MUTATIONS = {
+    'RegisterSeller': marketplace_pb2.RegisterSellerRequest,
+    'SellItem': marketplace_pb2.SellItemRequest,
+    'UpdateItem': marketplace_pb2.UpdateItemRequest,
+    'DeleteItem': marketplace_pb2.DeleteItemRequest,
+    'BuyItem': marketplace_pb2.BuyItemRequest,
+    'RateItem': marketplace_pb2.RateItemRequest,
+    'WishlistItem': marketplace_pb2.WishlistRequest,
+    'SellItems': marketplace_pb2.SellItemsRequest,
+    'UpdateItems': marketplace_pb2.UpdateItemsRequest,
+    'BuyItems': marketplace_pb2.BuyItemsRequest,
+}
+
+
+def encode_record(seq, method, request):
+    return json.dumps({
+        'seq': seq,
+        'method': method,
+        'request': base64.b64encode(request.SerializeToString()).decode('ascii'),
+    }) + '\n'
+
+
+def decode_record(line):
+    record = json.loads(line)
+    request = MUTATIONS[record['method']].FromString(base64.b64decode(record['request']))
+    return record['seq'], record['method'], request
+
+
+def segment_path(directory, first_seq):
+    return os.path.join(directory, f'wal-{first_seq:020d}.log')
+
+
+def segments(directory):
+    # zero padded names sort in seq order
+    return sorted(glob.glob(os.path.join(directory, 'wal-*.log')))
+
+
+class WriteAheadLog:
+    """
+    Append-only log of successful mutations, split into segments that start at a snapshot.
+
+    append() only buffers the record and hands back its sequence number. A flusher thread
+    writes and fsyncs everything buffered so far in one go (group commit) and wait_durable()
+    blocks a caller until its record is on disk.
+    """
+
+    def __init__(self, directory, next_seq=1, fsync=True):
+        self.directory = directory
+        self.fsync = fsync
+        self._cond = threading.Condition()
+        self._buffer = []
+        self._next_seq = next_seq
+        self._durable_seq = next_seq - 1
+        self._closed = False
+        self._file = open(segment_path(directory, next_seq), 'a', encoding='utf-8')
+        self._flusher = threading.Thread(target=self._flush_loop, name='wal-flusher', daemon=True)
+        self._flusher.start()
+
+    @property
+    def last_seq(self):
+        return self._next_seq - 1
+
+    def append(self, method, request):
+        with self._cond:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._buffer.append(encode_record(seq, method, request))
+            self._cond.notify_all()
+            return seq
+
+    def wait_durable(self, seq):
+        with self._cond:
+            while self._durable_seq < seq and not self._closed:
+                self._cond.wait()
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._buffer and not self._closed:
+                    self._cond.wait()
+                if not self._buffer and self._closed:
+                    return
+                lines, self._buffer = self._buffer, []
+                last_seq = self._next_seq - 1
+                log_file = self._file
+
+            log_file.write(''.join(lines))
+            log_file.flush()
+            if self.fsync:
+                os.fsync(log_file.fileno())
+
+            with self._cond:
+                self._durable_seq = last_seq
+                self._cond.notify_all()
+
+    def rotate(self):
+        """Start a new segment. The caller must keep appends out while this runs."""
+        self.wait_durable(self.last_seq)
+        with self._cond:
+            self._file.close()
+            self._file = open(segment_path(self.directory, self._next_seq), 'a', encoding='utf-8')
+            return self._next_seq
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._flusher.join()
+        self._file.close()
+
+
+class Persistence:
+    """
+    Makes a MarketplaceService durable: recovers it from the newest snapshot plus the log
+    tail, attaches a WriteAheadLog, and takes compact snapshots in the background.
+    """
+
+    def __init__(self, service, directory, snapshot_interval=SNAPSHOT_INTERVAL,
+                 snapshot_every=SNAPSHOT_EVERY_N_RECORDS, fsync=True):
+        self.service = service
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.wal = None
+        self._last_snapshot_seq = 0
+        self._stopped = threading.Event()
+        self._snapshotter = threading.Thread(target=self._snapshot_loop, name='snapshotter', daemon=True)
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        started = time.monotonic()
+        last_seq, replayed = self.recover()
+        logger.info("Recovered marketplace state up to record %s (%s replayed from the log) in %.2fs",
+                    last_seq, replayed, time.monotonic() - started)
+
+        self.wal = WriteAheadLog(self.directory, last_seq + 1, self.fsync)
+        self.service.wal = self.wal
+        self._snapshotter.start()
+        return self
+
+    def recover(self):
+        snapshot_seq = 0
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, encoding='utf-8') as snapshot_file:
+                snapshot = json.load(snapshot_file)
+            snapshot_seq = snapshot['seq']
+            self.service.load_state(snapshot['state'])
+        self._last_snapshot_seq = snapshot_seq
+
+        last_seq, replayed = snapshot_seq, 0
+        # replaying goes through the handlers, keep their per-request output quiet
+        # and don't notify anyone about things that happened before the restart
+        notifier, self.service.notifier = self.service.notifier, None
+        with quiet('marketplace.service'):
+            for path in segments(self.directory):
+                with open(path, encoding='utf-8') as log_file:
+                    for line in log_file:
+                        try:
+                            seq, method, request = decode_record(line)
+                        except ValueError:
+                            # torn write at the end of the log from a crash, nothing after it was acknowledged
+                            break
+                        if seq <= last_seq:
+                            continue
+                        getattr(self.service, method)(request, None)
+                        last_seq = seq
+                        replayed += 1
+        self.service.notifier = notifier
+        return last_seq, replayed
+
+    def snapshot(self):
+        # with the catalog write lock held no mutation can be half applied or half logged
+        with self.service.catalog_lock.write():
+            state = self.service.dump_state()
+            seq = self.wal.last_seq
+            self.wal.rotate()
+
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        tmp_path = snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as snapshot_file:
+            json.dump({'seq': seq, 'state': state}, snapshot_file, separators=(',', ':'))
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(tmp_path, snapshot_path)
+        self._last_snapshot_seq = seq
+
+        # every segment but the one just started is covered by the snapshot
+        for path in segments(self.directory)[:-1]:
+            os.remove(path)
+        logger.info("Snapshot at record %s written", seq)
+
+    def _snapshot_loop(self):
+        last_snapshot = time.monotonic()
+        while not self._stopped.wait(1):
+            pending = self.wal.last_seq - self._last_snapshot_seq
+            if not pending:
+                continue
+            if pending >= self.snapshot_every or time.monotonic() - last_snapshot >= self.snapshot_interval:
+                self.snapshot()
+                last_snapshot = time.monotonic()
+
+    def stop(self):
+        self._stopped.set()
+        if self._snapshotter.is_alive():
+            self._snapshotter.join()
+        self.service.wal = None
+        self.wal.close()
@@ -0,0 +1,306 @@
+import heapq
+import sys
+from array import array
+from typing import Dict, List
+
+from models import Product
+
+# optional, vectorizes ProductStore.select over the column buffers when installed (bruh.sh installs it)
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# compact once this many rows are dead and they outnumber the live ones
+MIN_DEAD_ROWS_TO_COMPACT = 1024
+# distinct categories a store can hold, the codes are kept in an array('H')
+MAX_CATEGORIES = 2 ** 16
+
+
+class ProductView:
+    """
+    A Product backed by a row of a ProductStore. Reads and writes go straight to the
+    columns, so views are cheap to hand out and never go stale while the product exists.
+    Like the store itself they must only be used under the catalog lock.
+    """
+    __slots__ = ('_store', 'id')
+
+    def __init__(self, store, _id):
+        self._store = store
+        self.id = _id
+
+    def _row(self):
+        return self._store.row_of[self.id]
+
+    @property
+    def name(self):
+        return self._store.names[self._row()]
+
+    @property
+    def description(self):
+        return self._store.descriptions[self._row()]
+
+    @property
+    def seller_ip_port(self):
+        return self._store.seller_ip_ports[self._row()]
+
+    @property
+    def category(self):
+        return self._store.category_names[self._store.categories[self._row()]]
+
+    @property
+    def price(self):
+        return self._store.prices[self._row()]
+
+    @price.setter
+    def price(self, value):
+        self._store.prices[self._row()] = value
+
+    @property
+    def quantity(self):
+        return self._store.quantities[self._row()]
+
+    @quantity.setter
+    def quantity(self, value):
+        self._store.quantities[self._row()] = value
+
+    @property
+    def rating(self):
+        return self._store.ratings[self._row()]
+
+    @rating.setter
+    def rating(self, value):
+        self._store.ratings[self._row()] = value
+
+    @property
+    def n_ratings(self):
+        return self._store.n_ratings[self._row()]
+
+    @n_ratings.setter
+    def n_ratings(self, value):
+        self._store.n_ratings[self._row()] = value
+
+    __hash__ = Product.__hash__
+    __eq__ = Product.__eq__
+    __str__ = Product.__str__
+
+
+class ProductStore:
+    """
+    Columnar storage for the catalog: one typed array per numeric field, small integer
+    codes for categories and interned string tables for the rest, instead of one Product
+    object with its own __dict__ per listing.
+
+    Rows are appended in id order and deleted rows are only dropped by an order
+    preserving compaction, so iterating the store always yields increasing ids.
+    Supports the dict operations the service used on its id -> Product dict.
+    """
+
+    def __init__(self):
+        self.ids = array('q')
+        self.prices = array('d')
+        self.quantities = array('q')
+        self.ratings = array('d')
+        self.n_ratings = array('q')
+        self.categories = array('H')
+        self.alive = array('b')
+        self.names: List[str] = []
+        self.descriptions: List[str] = []
+        self.seller_ip_ports: List[str] = []
+
+        self.category_names: List[str] = []
+        self.category_codes: Dict[str, int] = dict()
+        self.row_of: Dict[int, int] = dict()
+        self._dead = 0
+
+    def category_code(self, category):
+        code = self.category_codes.get(category)
+        if code is None:
+            if len(self.category_names) >= MAX_CATEGORIES:
+                raise ValueError(f'no room for more than {MAX_CATEGORIES} categories')
+            code = self.category_codes[category] = len(self.category_names)
+            self.category_names.append(sys.intern(category))
+        return code
+
+    def has_room_for(self, categories):
+        """Whether products of all of categories can be added."""
+        new = {category for category in categories if category not in self.category_codes}
+        return len(self.category_names) + len(new) <= MAX_CATEGORIES
+
+    def add(self, product):
+        # anything that can fail before the first column grows, so a failed add changes nothing
+        category = self.category_code(product.category)
+        self.row_of[product.id] = len(self.ids)
+        self.ids.append(product.id)
+        self.prices.append(product.price)
+        self.quantities.append(product.quantity)
+        self.ratings.append(product.rating)
+        self.n_ratings.append(product.n_ratings)
+        self.categories.append(category)
+        self.alive.append(1)
+        self.names.append(sys.intern(product.name))
+        self.descriptions.append(product.description)
+        self.seller_ip_ports.append(sys.intern(product.seller_ip_port))
+        return ProductView(self, product.id)
+
+    def __delitem__(self, _id):
+        row = self.row_of.pop(_id)
+        self.alive[row] = 0
+        # free the strings right away, the numeric columns wait for compaction
+        self.names[row] = self.descriptions[row] = self.seller_ip_ports[row] = ''
+        self._dead += 1
+        if self._dead >= MIN_DEAD_ROWS_TO_COMPACT and self._dead > len(self.row_of):
+            self.compact()
+
+    def compact(self):
+        live = [row for row in range(len(self.ids)) if self.alive[row]]
+        for column in ('ids', 'prices', 'quantities', 'ratings', 'n_ratings', 'categories', 'alive'):
+            old = getattr(self, column)
+            setattr(self, column, array(old.typecode, (old[row] for row in live)))
+        for column in ('names', 'descriptions', 'seller_ip_ports'):
+            old = getattr(self, column)
+            setattr(self, column, [old[row] for row in live])
+        self.row_of = {_id: row for row, _id in enumerate(self.ids)}
+        self._dead = 0
+
+    def copy(self):
+        """A copy that stays as it is while this store changes, e.g. to dump it without the catalog lock."""
+        store = ProductStore()
+        for column in ('ids', 'prices', 'quantities', 'ratings', 'n_ratings', 'categories', 'alive',
+                       'names', 'descriptions', 'seller_ip_ports', 'category_names'):
+            setattr(store, column, getattr(self, column)[:])
+        store.category_codes = dict(self.category_codes)
+        store.row_of = dict(self.row_of)
+        store._dead = self._dead
+        return store
+
+    def take(self, _id, quantity):
+        """
+        Compare and decrement: takes quantity units of _id if that many are left and returns
+        how many remain, None when there aren't enough. The caller holds the product's lock.
+        """
+        row = self.row_of[_id]
+        remaining = self.quantities[row] - quantity
+        if remaining < 0:
+            return None
+        self.quantities[row] = remaining
+        return remaining
+
+    def select(self, ids=None, category=None, min_price=None, max_price=None, min_rating=None, in_stock=False):
+        """
+        Ids of the live products, out of ids or the whole store, that pass every given filter.
+        Keeps the order of ids, or increasing id order when scanning the whole store.
+        """
+        if ids is not None and not ids:
+            return []
+        if not len(self.ids):
+            return []
+        if category is not None:
+            category = self.category_codes.get(category)
+            # no product was ever listed in it
+            if category is None:
+                return []
+
+        if numpy is not None:
+            return self._select_vectorized(ids, category, min_price, max_price, min_rating, in_stock)
+
+        rows = range(len(self.ids)) if ids is None else [self.row_of[_id] for _id in ids]
+        prices, quantities, ratings, categories = self.prices, self.quantities, self.ratings, self.categories
+        return [self.ids[row] for row in rows
+                if self.alive[row]
+                and (category is None or categories[row] == category)
+                and (min_price is None or prices[row] >= min_price)
+                and (max_price is None or prices[row] <= max_price)
+                and (min_rating is None or ratings[row] >= min_rating)
+                and (not in_stock or quantities[row] > 0)]
+
+    def _select_vectorized(self, ids, category, min_price, max_price, min_rating, in_stock):
+        # frombuffer shares memory with the arrays, which can't grow while it is exported;
+        # every numpy object here is dropped before returning
+        rows = None if ids is None else numpy.fromiter((self.row_of[_id] for _id in ids), numpy.int64, len(ids))
+
+        def column(values, dtype):
+            full = numpy.frombuffer(values, dtype)
+            return full if rows is None else full[rows]
+
+        mask = column(self.alive, numpy.int8).astype(bool)
+        if category is not None:
+            mask &= column(self.categories, numpy.uint16) == category
+        if min_price is not None or max_price is not None:
+            prices = column(self.prices, numpy.float64)
+            if min_price is not None:
+                mask &= prices >= min_price
+            if max_price is not None:
+                mask &= prices <= max_price
+        if min_rating is not None:
+            mask &= column(self.ratings, numpy.float64) >= min_rating
+        if in_stock:
+            mask &= column(self.quantities, numpy.int64) > 0
+        return column(self.ids, numpy.int64)[mask].tolist()
+
+    def order(self, ids, column, descending=False, limit=None):
+        """
+        ids sorted by one of the numeric columns ('prices', 'ratings', 'n_ratings', 'ids'),
+        ties broken by increasing id. With a limit only the top limit are selected and sorted.
+        """
+        ids = ids if isinstance(ids, list) else list(ids)
+        if limit is not None and limit >= len(ids):
+            limit = None
+        if numpy is not None and ids:
+            return self._order_vectorized(ids, column, descending, limit)
+
+        values, row_of = getattr(self, column), self.row_of
+        sign = -1 if descending else 1
+
+        def key(_id):
+            return sign * values[row_of[_id]], _id
+
+        if limit is None:
+            return sorted(ids, key=key)
+        return heapq.nsmallest(limit, ids, key=key)
+
+    def _order_vectorized(self, ids, column, descending, limit):
+        values = getattr(self, column)
+        rows = numpy.fromiter((self.row_of[_id] for _id in ids), numpy.int64, len(ids))
+        keys = numpy.frombuffer(values, numpy.dtype(values.typecode))[rows].astype(numpy.float64)
+        del rows
+        if descending:
+            keys = -keys
+        ids = numpy.array(ids, numpy.int64)
+        if limit is not None:
+            # partial selection of the top limit, only those get fully sorted. Ties on the
+            # cut-off key are settled by id, so pages cut at different limits agree
+            cutoff = numpy.partition(keys, limit - 1)[limit - 1]
+            above, tied = keys < cutoff, keys == cutoff
+            tied_ids = numpy.sort(ids[tied])[:limit - int(above.sum())]
+            ids = numpy.concatenate((ids[above], tied_ids))
+            keys = numpy.concatenate((keys[above], numpy.full(len(tied_ids), cutoff)))
+        return ids[numpy.lexsort((ids, keys))].tolist()
+
+    def get(self, _id, default=None):
+        if _id in self.row_of:
+            return ProductView(self, _id)
+        return default
+
+    def __getitem__(self, _id):
+        if _id not in self.row_of:
+            raise KeyError(_id)
+        return ProductView(self, _id)
+
+    def __contains__(self, _id):
+        return _id in self.row_of
+
+    def __len__(self):
+        return len(self.row_of)
+
+    def __iter__(self):
+        return iter(self.row_of)
+
+    def keys(self):
+        return self.row_of.keys()
+
+    def values(self):
+        return (ProductView(self, _id) for _id in self.row_of)
+
+    def items(self):
+        return ((_id, ProductView(self, _id)) for _id in self.row_of)
@@ -0,0 +1,220 @@
+import itertools
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+
+import grpc
+
+from client import CHANNEL_OPTIONS
+from marketplace import MarketplaceService
+from persistence import MUTATIONS
+from structured_logging import fields
+
+import marketplace_pb2
+import marketplace_pb2_grpc
+
+# changes a primary keeps for replicas that fall behind, older ones resync from a snapshot
+FEED_RETENTION = 100000
+# how often an idle Follow stream checks that its replica is still there
+FOLLOW_POLL_INTERVAL = 1
+RECONNECT_BACKOFF = 1
+# a snapshot goes out in pieces of about this size, far below the message size limit
+SNAPSHOT_PIECE_BYTES = 1024 * 1024
+# and a seller's or buyer's ids in entries of at most this many
+SNAPSHOT_PIECE_IDS = 50000
+MAX_RECONNECT_BACKOFF = 30
+
+logger = logging.getLogger('marketplace.replication')
+
+
+class ChangeFeed:
+    """
+    The recent mutations of a primary in apply order, numbered from 1. Appended to under
+    the locks of the mutation, like the write-ahead log, and read by the Follow streams.
+    """
+
+    def __init__(self, retention=FEED_RETENTION):
+        # tells the feeds of different runs of the primary apart, their seqs overlap
+        self.epoch = uuid.uuid4().hex
+        self._cond = threading.Condition()
+        self._changes = deque(maxlen=retention)  # (seq, method, serialized request)
+        self.last_seq = 0
+
+    def append(self, method, request):
+        data = request.SerializeToString()
+        with self._cond:
+            self.last_seq += 1
+            self._changes.append((self.last_seq, method, data))
+            self._cond.notify_all()
+
+    def since(self, after_seq, timeout):
+        """
+        The changes after after_seq, waiting up to timeout for one when there are none yet.
+        None when some of them are no longer kept.
+        """
+        with self._cond:
+            if after_seq >= self.last_seq:
+                self._cond.wait(timeout)
+            if after_seq >= self.last_seq:
+                return []
+            first_seq = self._changes[0][0]
+            if after_seq + 1 < first_seq:
+                return None
+            # seqs are contiguous, so the position follows from the seq
+            return list(itertools.islice(self._changes, after_seq + 1 - first_seq, None))
+
+
+def _split_ids(entries):
+    # entries ending in a list of ids, like [ip_port, uuid, ids], cut into bounded ones
+    for entry in entries:
+        ids = entry[-1]
+        if not isinstance(ids, list) or len(ids) <= SNAPSHOT_PIECE_IDS:
+            yield entry
+            continue
+        for start in range(0, len(ids), SNAPSHOT_PIECE_IDS):
+            yield entry[:-1] + [ids[start:start + SNAPSHOT_PIECE_IDS]]
+
+
+def snapshot_pieces(state, max_bytes=SNAPSHOT_PIECE_BYTES):
+    """A dump_state() as JSON objects of up to about max_bytes, each with entries of one of its sections."""
+    for section, value in state.items():
+        if not isinstance(value, list):
+            yield json.dumps({section: value})
+            continue
+        encoded, size = [], 0
+        for entry in _split_ids(value):
+            text = json.dumps(entry, separators=(',', ':'))
+            if encoded and size + len(text) > max_bytes:
+                yield '{"%s":[%s]}' % (section, ','.join(encoded))
+                encoded, size = [], 0
+            encoded.append(text)
+            size += len(text) + 1
+        if encoded or not value:
+            yield '{"%s":[%s]}' % (section, ','.join(encoded))
+
+
+def merge_piece(state, piece):
+    # the other side of snapshot_pieces
+    for section, value in json.loads(piece).items():
+        if isinstance(value, list):
+            state.setdefault(section, []).extend(value)
+        else:
+            state[section] = value
+
+
+class ReplicationService(marketplace_pb2_grpc.ReplicationServicer):
+    """Streams the change feed of a primary MarketplaceService to its replicas."""
+
+    def __init__(self, service: MarketplaceService):
+        self.service = service
+        if service.change_feed is None:
+            service.change_feed = ChangeFeed()
+
+    def _snapshot(self):
+        # every mutation logs its change holding at least the catalog read lock, so with the
+        # write lock the state and the feed position agree. Only a copy is taken under it,
+        # dumping and sending happen after
+        feed = self.service.change_feed
+        with self.service.catalog_lock.write():
+            copy = self.service.state_copy()
+            seq = feed.last_seq
+        for piece in snapshot_pieces(self.service.dump_state(copy)):
+            yield marketplace_pb2.Change(snapshot=piece)
+        yield marketplace_pb2.Change(seq=seq, epoch=feed.epoch, snapshot_end=True)
+
+    def Follow(self, request, context):
+        feed = self.service.change_feed
+        after_seq = request.after_seq
+        logger.info("replica following", extra=fields(after_seq=after_seq, epoch=request.epoch))
+
+        # a new replica or one that followed a previous run of the primary starts over
+        changes = [] if after_seq and request.epoch == feed.epoch else None
+        while context.is_active():
+            if changes is None:
+                for change in self._snapshot():
+                    yield change
+                after_seq = change.seq
+            for seq, method, data in changes or ():
+                yield marketplace_pb2.Change(seq=seq, method=method, request=data)
+                after_seq = seq
+            changes = feed.since(after_seq, FOLLOW_POLL_INTERVAL)
+
+
+def _read_only(method):
+    def handler(self, request, context):
+        context.abort(grpc.StatusCode.FAILED_PRECONDITION,
+                      f'{method} is not served by a read-only replica, send it to the primary')
+    return handler
+
+
+def _once_synced(method):
+    serve = getattr(MarketplaceService, method)
+
+    def handler(self, request, context):
+        # before the first snapshot the catalog is empty, not the primary's
+        if not self.epoch:
+            context.abort(grpc.StatusCode.UNAVAILABLE, 'the replica has not synced with its primary yet, retry later')
+        return serve(self, request, context)
+    return handler
+
+
+class ReplicaService(MarketplaceService):
+    """
+    A read-only copy of a primary. A background thread follows the primary's change feed
+    and applies each change through the same handlers the primary ran it with, so
+    searches and seller listings are answered locally. Writes and Subscribe are refused,
+    and so are reads until the first snapshot is in.
+    """
+
+    def __init__(self, primary):
+        super().__init__()
+        self.primary = primary
+        self.applied_seq = 0
+        self.epoch = ''
+        # the pieces of the snapshot being received
+        self._pieces = dict()
+        self._follower = threading.Thread(target=self._follow_loop, name='replica-follower', daemon=True)
+
+    def start(self):
+        self._follower.start()
+        return self
+
+    def _apply(self, change):
+        if change.snapshot:
+            merge_piece(self._pieces, change.snapshot)
+            return
+        if change.snapshot_end:
+            self.load_state(self._pieces)
+            self._pieces = dict()
+            self.epoch = change.epoch
+        else:
+            request = MUTATIONS[change.method].FromString(change.request)
+            getattr(MarketplaceService, change.method)(self, request, None)
+        self.applied_seq = change.seq
+
+    def _follow_loop(self):
+        backoff = RECONNECT_BACKOFF
+        with grpc.insecure_channel(self.primary, options=CHANNEL_OPTIONS) as channel:
+            stub = marketplace_pb2_grpc.ReplicationStub(channel)
+            while True:
+                try:
+                    # a snapshot cut off by the reconnect is sent again from the start
+                    self._pieces = dict()
+                    request = marketplace_pb2.FollowRequest(after_seq=self.applied_seq, epoch=self.epoch)
+                    for change in stub.Follow(request):
+                        self._apply(change)
+                        backoff = RECONNECT_BACKOFF
+                except grpc.RpcError as error:
+                    logger.warning("lost the primary, reconnecting in %ss", backoff,
+                                   extra=fields(primary=self.primary, code=error.code().name))
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MAX_RECONNECT_BACKOFF)
+
+
+for _method in list(MUTATIONS) + ['Subscribe']:
+    setattr(ReplicaService, _method, _read_only(_method))
+for _method in ('SearchItem', 'SearchItemStream', 'DisplaySellerItems'):
+    setattr(ReplicaService, _method, _once_synced(_method))
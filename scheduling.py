@@ -0,0 +1,160 @@
+import logging
+import threading
+from concurrent import futures
+
+import grpc
+
+# the lane each RPC runs in: quick point reads and writes, expensive searches and
+# batches, and the streams that hold a worker for as long as a client listens
+METHOD_LANES = {
+    'RegisterSeller': 'point',
+    'SellItem': 'point',
+    'UpdateItem': 'point',
+    'DeleteItem': 'point',
+    'BuyItem': 'point',
+    'RateItem': 'point',
+    'WishlistItem': 'point',
+    'DisplaySellerItems': 'point',
+    'SearchItem': 'scan',
+    'SearchItemStream': 'scan',
+    'SellItems': 'scan',
+    'UpdateItems': 'scan',
+    'BuyItems': 'scan',
+    'Subscribe': 'stream',
+    'Follow': 'stream',
+}
+# where everything not listed above (and not tagged by LaneInterceptor) runs
+DEFAULT_LANE = 'point'
+STREAM_LANE = 'stream'
+# lanes whose RPCs hold their worker until the client goes away: waiting for one of them to
+# end is pointless, so when all workers are taken new RPCs are refused instead of queued
+UNQUEUED_LANES = (STREAM_LANE,)
+
+logger = logging.getLogger('marketplace.scheduling')
+
+
+class LaneExecutor(futures.Executor):
+    """
+    A thread pool per lane, so a queue of full catalog searches or a crowd of Subscribe
+    streams can't hold up a BuyItem. It is handed to grpc.server as its pool, which runs
+    whatever isn't tagged, in DEFAULT_LANE; LaneInterceptor tags the behavior of every RPC
+    with the pool of its lane through experimental_thread_pool, which grpc submits it to
+    instead. An RPC for one of UNQUEUED_LANES that finds all of its lane's workers taken
+    fails with RESOURCE_EXHAUSTED right away, from the DEFAULT_LANE pool.
+    """
+
+    def __init__(self, workers_by_lane):
+        if DEFAULT_LANE not in workers_by_lane:
+            raise ValueError(f'the {DEFAULT_LANE} lane needs workers')
+        default = futures.ThreadPoolExecutor(max_workers=workers_by_lane[DEFAULT_LANE],
+                                             thread_name_prefix=f'lane-{DEFAULT_LANE}')
+        self._pools = {lane: _UnqueuedPool(lane, workers, default) if lane in UNQUEUED_LANES
+                       else futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'lane-{lane}')
+                       for lane, workers in workers_by_lane.items() if lane != DEFAULT_LANE}
+        self._pools[DEFAULT_LANE] = default
+
+    def pool(self, lane):
+        """The pool RPCs of lane run in, the DEFAULT_LANE one for lanes without workers of their own."""
+        return self._pools.get(lane, self._pools[DEFAULT_LANE])
+
+    @property
+    def refused(self):
+        """RPCs refused so far because all workers of their lane were taken."""
+        return sum(pool.refused for pool in self._pools.values() if isinstance(pool, _UnqueuedPool))
+
+    def submit(self, fn, *args, **kwargs):
+        return self._pools[DEFAULT_LANE].submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        for pool in self._pools.values():
+            pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+# set while a refused RPC runs in the overflow pool, read by the behavior _tagged wraps
+_refusing = threading.local()
+
+
+class _UnqueuedPool(futures.ThreadPoolExecutor):
+    """The pool of one of UNQUEUED_LANES: past max_workers running calls, the call runs in overflow and is refused."""
+
+    def __init__(self, lane, max_workers, overflow):
+        super().__init__(max_workers=max_workers, thread_name_prefix=f'lane-{lane}')
+        self.lane = lane
+        self.workers = max_workers
+        self.overflow = overflow
+        self._lock = threading.Lock()
+        self._running = 0
+        self.refused = 0
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            full = self._running >= self.workers
+            if full:
+                self.refused += 1
+            else:
+                self._running += 1
+        if full:
+            return self.overflow.submit(_refused, self.lane, fn, *args, **kwargs)
+        future = super().submit(fn, *args, **kwargs)
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, _):
+        with self._lock:
+            self._running -= 1
+
+
+def _refused(lane, fn, *args, **kwargs):
+    _refusing.lane = lane
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _refusing.lane = None
+
+
+def _tagged(behavior, pool):
+    def run(request, context):
+        lane = getattr(_refusing, 'lane', None)
+        if lane is not None:
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, f'all {lane} workers are taken, retry later')
+        return behavior(request, context)
+    run.experimental_thread_pool = pool
+    return run
+
+
+class LaneInterceptor(grpc.ServerInterceptor):
+    """Tags the behavior of every RPC with the pool of its lane. Must be the first interceptor of the server."""
+
+    def __init__(self, executor, method_lanes=None):
+        self.executor = executor
+        self.method_lanes = method_lanes or METHOD_LANES
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        lane = self.method_lanes.get(handler_call_details.method.rsplit('/', 1)[-1], DEFAULT_LANE)
+        pool = self.executor.pool(lane)
+        if handler.unary_unary is not None:
+            return grpc.unary_unary_rpc_method_handler(
+                _tagged(handler.unary_unary, pool), handler.request_deserializer, handler.response_serializer)
+        if handler.unary_stream is not None:
+            return grpc.unary_stream_rpc_method_handler(
+                _tagged(handler.unary_stream, pool), handler.request_deserializer, handler.response_serializer)
+        return handler
+
+
+def with_stream_lane(workers_by_lane, max_streams):
+    """workers_by_lane, with max_streams workers for the stream lane unless it sets its own."""
+    workers_by_lane = dict(workers_by_lane)
+    workers_by_lane.setdefault(STREAM_LANE, max_streams)
+    return workers_by_lane
+
+
+def parse_lanes(lanes):
+    """'point=16,scan=4,stream=64' as given on the command line, to {'point': 16, ...}."""
+    workers_by_lane = dict()
+    for entry in lanes.split(','):
+        lane, _, workers = entry.partition('=')
+        workers_by_lane[lane] = int(workers)
+    return workers_by_lane
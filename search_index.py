@@ -0,0 +1,133 @@
+from typing import Dict, Iterator, Set
+
+# names are indexed by every substring of up to this many characters
+GRAM_SIZE = 3
+
+
+class TrieNode:
+    __slots__ = ('children', 'terminal')
+
+    def __init__(self):
+        self.children: Dict[str, TrieNode] = dict()
+        self.terminal = False
+
+
+class Trie:
+    def __init__(self):
+        self.root = TrieNode()
+
+    def add(self, word):
+        node = self.root
+        for char in word:
+            node = node.children.setdefault(char, TrieNode())
+        node.terminal = True
+
+    def remove(self, word):
+        path = [self.root]
+        for char in word:
+            node = path[-1].children.get(char)
+            if node is None:
+                return
+            path.append(node)
+        path[-1].terminal = False
+
+        # prune the branch back up to the last node that is still in use
+        for depth in range(len(word), 0, -1):
+            node = path[depth]
+            if node.terminal or node.children:
+                break
+            del path[depth - 1].children[word[depth - 1]]
+
+    def with_prefix(self, prefix) -> Iterator[str]:
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return
+
+        stack = [(prefix, node)]
+        while stack:
+            word, node = stack.pop()
+            if node.terminal:
+                yield word
+            for char, child in node.children.items():
+                stack.append((word + char, child))
+
+
+def grams(word):
+    grams_of_word = set()
+    for size in range(1, GRAM_SIZE + 1):
+        for start in range(len(word) - size + 1):
+            grams_of_word.add(word[start:start + size])
+    return grams_of_word
+
+
+class NameSearchIndex:
+    """
+    Case-insensitive prefix and substring lookups over product names.
+    Prefixes are answered by walking a trie of the distinct names, substrings by
+    intersecting the n-gram posting lists of the query and checking the survivors.
+    """
+
+    def __init__(self):
+        self.ids_by_name: Dict[str, Set[int]] = dict()
+        self.trie = Trie()
+        self.postings: Dict[str, Set[str]] = dict()
+
+    def add(self, name, product_id):
+        key = name.lower()
+        ids = self.ids_by_name.get(key)
+        if ids is None:
+            ids = self.ids_by_name[key] = set()
+            self.trie.add(key)
+            for gram in grams(key):
+                self.postings.setdefault(gram, set()).add(key)
+        ids.add(product_id)
+
+    def remove(self, name, product_id):
+        key = name.lower()
+        ids = self.ids_by_name.get(key)
+        if ids is None:
+            return
+        ids.discard(product_id)
+        if ids:
+            return
+
+        # last product with this name is gone
+        del self.ids_by_name[key]
+        self.trie.remove(key)
+        for gram in grams(key):
+            names = self.postings[gram]
+            names.discard(key)
+            if not names:
+                del self.postings[gram]
+
+    def _ids_of(self, names) -> Set[int]:
+        ids = set()
+        for name in names:
+            ids |= self.ids_by_name[name]
+        return ids
+
+    def prefix(self, query) -> Set[int]:
+        return self._ids_of(self.trie.with_prefix(query.lower()))
+
+    def substring(self, query) -> Set[int]:
+        query = query.lower()
+        if not query:
+            return self._ids_of(self.ids_by_name)
+
+        # short queries are grams themselves, so their posting list is the exact answer
+        if len(query) <= GRAM_SIZE:
+            return self._ids_of(self.postings.get(query, ()))
+
+        posting_lists = []
+        for start in range(len(query) - GRAM_SIZE + 1):
+            names = self.postings.get(query[start:start + GRAM_SIZE])
+            if names is None:
+                return set()
+            posting_lists.append(names)
+
+        posting_lists.sort(key=len)
+        candidates = posting_lists[0].intersection(*posting_lists[1:])
+        # grams can match out of order, so confirm the whole query is there
+        return self._ids_of(name for name in candidates if query in name)
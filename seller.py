@@ -1,26 +1,32 @@
 import threading
-from concurrent import futures
 
 import grpc
 import uuid
 
 import marketplace_pb2
-import marketplace_pb2_grpc
+from client import MarketplaceClient
 
 
-class SellerNotificationService(marketplace_pb2_grpc.notificationServicer):
-    def SendNotification(self, request, context):
-        print("\nReceived a notification: ", request.message)
-        return marketplace_pb2.NotificationResponse(response="Received a notification")
+def listen_for_notifications():
+    # notifications come back over the marketplace channel, no inbound port needed
+    subscription = stub.Subscribe(marketplace_pb2.SubscribeRequest(ip_port=ip_port))
+    print("Listening for purchase notifs...")
+    try:
+        for notification in subscription:
+            print("\nReceived a notification: ", notification.message)
+    except grpc.RpcError as error:
+        if error.code() == grpc.StatusCode.RESOURCE_EXHAUSTED:
+            print("\nThe marketplace takes no more subscribers right now, no notifications this session")
+        else:
+            print("\nStopped receiving notifications: ", error.code())
 
 
-def run_notif_server():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    marketplace_pb2_grpc.add_notificationServicer_to_server(SellerNotificationService(), server)
-    server.add_insecure_port("[::]:50052")
-    server.start()
-    print("Listening for purchase notifs...")
-    server.wait_for_termination()
+def start_listening():
+    # only once there is something to be notified about, every stream holds on to a server thread
+    global notif_thread
+    if notif_thread is None:
+        notif_thread = threading.Thread(target=listen_for_notifications, daemon=True)
+        notif_thread.start()
 
 
 menu = """
@@ -52,14 +58,13 @@ Enter the number of the category of the new product:
 
 ip_port = "127.0.0.1:50052"
 seller_uuid = str(uuid.uuid1())
-channel = grpc.insecure_channel('localhost:50051')
-stub = marketplace_pb2_grpc.MarketplaceStub(channel)
+# one connection with keepalive, see client.py
+stub = MarketplaceClient('localhost:50051', pool_size=1)
 
 print("You are connecting from {} with uuid={}".format(ip_port, seller_uuid))
 print(welcome)
 
-# notif_server_thread = threading.Thread(target=run_notif_server)
-# notif_server_thread.start()
+notif_thread = None
 
 while True:
     print(menu)
@@ -68,6 +73,8 @@ while True:
         register_response = stub.RegisterSeller(marketplace_pb2.RegisterSellerRequest(ip_port=ip_port, uuid=seller_uuid))
         print(register_response.status)
         print(register_response.message)
+        if register_response.status == "SUCCESS":
+            start_listening()
     elif choice == '2':
         name_of_item = input("Enter the name of the item: ")
         quantity = int(input("Enter the quantity of the item: "))
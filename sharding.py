@@ -0,0 +1,298 @@
+import heapq
+import itertools
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+import grpc
+
+from admission import AdmissionInterceptor
+from client import CHANNEL_OPTIONS
+from marketplace import (MAX_SEARCH_PAGE_SIZE, MAX_STREAMS, MAX_WORKERS, SEARCH_PAGE_SIZE, SERVER_OPTIONS,
+                         MarketplaceService, product_from_message, search_error, serve)
+from metrics import Metrics, MetricsInterceptor, serve_metrics
+from notifications import NotificationDispatcher, SubscriptionHub
+from scheduling import DEFAULT_LANE, LaneExecutor, LaneInterceptor, with_stream_lane
+from structured_logging import configure as configure_logging, fields
+
+import marketplace_pb2
+import marketplace_pb2_grpc
+
+SHARD_READY_TIMEOUT = 15
+# wait before following the notifications of a shard again after losing them
+NOTIFICATION_RECONNECT_DELAY = 1
+
+logger = logging.getLogger('marketplace.sharding')
+
+# Product message field each sort key orders by, recency is the id
+SORT_FIELDS = {
+    marketplace_pb2.PRICE: 'price',
+    marketplace_pb2.RATING: 'rating',
+    marketplace_pb2.N_RATINGS: 'n_ratings',
+    marketplace_pb2.RECENCY: '_id',
+}
+
+
+def shard_of(product_id, n_shards):
+    # shard i hands out the ids i + 1, i + 1 + n_shards, ...
+    return (product_id - 1) % n_shards
+
+
+def run_shard(index, n_shards, port, max_workers, data_dir=None, log_level='INFO', lanes=None,
+              max_streams=MAX_STREAMS):
+    # spawned, so nothing of the parent's logging setup is inherited
+    configure_logging(log_level)
+    # notifications go out from the router, which follows every shard's
+    service = MarketplaceService(id_start=index + 1, id_step=n_shards)
+    # every shard logs and snapshots its own partition
+    shard_dir = os.path.join(data_dir, f'shard-{index}') if data_dir is not None else None
+    serve(port, max_workers, service, shard_dir, lanes=lanes, max_streams=max_streams)
+
+
+class ShardRouter(marketplace_pb2_grpc.MarketplaceServicer):
+    """
+    Front of a sharded marketplace. Products are partitioned by id over the shards;
+    point operations go to the owning shard, sellers are registered on every shard,
+    and searches and seller listings are fanned out and merged in id order.
+    Notifications of all shards come in over one stream per shard and are handed to
+    the router's own Subscribe streams, or to notifier for clients without one.
+    """
+
+    def __init__(self, channels, notifier=None):
+        self.stubs = [marketplace_pb2_grpc.MarketplaceStub(channel) for channel in channels]
+        self._next_shard = itertools.count()
+        self.subscriptions = SubscriptionHub()
+        self.notifier = notifier
+
+    def start(self):
+        for index, stub in enumerate(self.stubs):
+            threading.Thread(target=self._follow_notifications, args=(index, stub),
+                             name=f'notifications-{index}', daemon=True).start()
+        return self
+
+    def _follow_notifications(self, index, stub):
+        request = marketplace_pb2.SubscribeRequest(all_recipients=True)
+        while True:
+            try:
+                for notification in stub.Subscribe(request, wait_for_ready=True):
+                    if not self.subscriptions.publish(notification.ip_port, notification.message) \
+                            and self.notifier is not None:
+                        self.notifier.notify(notification.ip_port, notification.message)
+            except grpc.RpcError as error:
+                logger.warning("lost the notifications of a shard, reconnecting",
+                               extra=fields(shard=index, code=error.code().name))
+            time.sleep(NOTIFICATION_RECONNECT_DELAY)
+
+    def _owner(self, product_id):
+        return self.stubs[shard_of(product_id, len(self.stubs))]
+
+    @staticmethod
+    def _forward(call, request, context):
+        try:
+            return call(request)
+        except grpc.RpcError as error:
+            context.abort(error.code(), error.details())
+
+    def _fan_out(self, method, request, context):
+        calls = [getattr(stub, method).future(request) for stub in self.stubs]
+        try:
+            return [call.result() for call in calls]
+        except grpc.RpcError as error:
+            context.abort(error.code(), error.details())
+
+    # Seller functions
+    def RegisterSeller(self, request, context):
+        responses = self._fan_out('RegisterSeller', request, context)
+        for response in responses:
+            if response.status != "SUCCESS":
+                return response
+        return responses[0]
+
+    def SellItem(self, request, context):
+        # round robin keeps the shards evenly filled
+        stub = self.stubs[next(self._next_shard) % len(self.stubs)]
+        return self._forward(stub.SellItem, request, context)
+
+    def DeleteItem(self, request, context):
+        return self._forward(self._owner(request._id).DeleteItem, request, context)
+
+    def DisplaySellerItems(self, request, context):
+        responses = self._fan_out('DisplaySellerItems', request, context)
+        if any(response.status != "SUCCESS" for response in responses):
+            return marketplace_pb2.DisplaySellerItemsResponse(output="Seller not found", status="FAIL")
+        items_details = "\n_________\n".join(response.output for response in responses if response.output)
+        return marketplace_pb2.DisplaySellerItemsResponse(output=items_details, status="SUCCESS")
+
+    # buyer functions
+    def _merged_products(self, request):
+        """
+        Products matching a SearchItemStreamRequest from every shard, merged into the order a
+        single server would return them, from request.cursor on and cut at request.limit.
+        """
+        limit = request.limit or None
+        shard_request = marketplace_pb2.SearchItemStreamRequest()
+        shard_request.CopyFrom(request)
+        shard_request.page_size = MAX_SEARCH_PAGE_SIZE
+
+        if request.sort_by == marketplace_pb2.ID:
+            # every shard can skip to the cursor id by itself
+            key, start = (lambda product: product._id), 0
+        else:
+            # a position can't be split over shards, each one ranks its top cursor + limit instead
+            shard_request.cursor = 0
+            shard_request.limit = request.cursor + limit if limit else 0
+            field = SORT_FIELDS[request.sort_by]
+            sign = -1 if request.descending != (request.sort_by == marketplace_pb2.RECENCY) else 1
+
+            def key(product):
+                return sign * getattr(product, field), product._id
+            start = request.cursor
+
+        streams = [(product for page in stub.SearchItemStream(shard_request) for product in page.products)
+                   for stub in self.stubs]
+        merged = heapq.merge(*streams, key=key)
+        return itertools.islice(merged, start, start + limit if limit else None)
+
+    def SearchItem(self, request, context):
+        message = search_error(request)
+        if message:
+            return marketplace_pb2.SearchItemResponse(status="FAIL", message=message)
+        stream_request = marketplace_pb2.SearchItemStreamRequest(
+            name=request.name, category=request.category, match=request.match, filters=request.filters,
+            sort_by=request.sort_by, descending=request.descending, limit=request.limit)
+        try:
+            message = "".join(str(product_from_message(product)) + '\n'
+                              for product in self._merged_products(stream_request))
+        except grpc.RpcError as error:
+            context.abort(error.code(), error.details())
+        return marketplace_pb2.SearchItemResponse(status="SUCCESS", message=message)
+
+    def SearchItemStream(self, request, context):
+        if search_error(request):
+            yield marketplace_pb2.SearchItemPage(status="FAIL")
+            return
+        page_size = request.page_size or SEARCH_PAGE_SIZE
+        page_size = min(page_size, MAX_SEARCH_PAGE_SIZE)
+        by_id = request.sort_by == marketplace_pb2.ID
+
+        page, sent = [], 0
+        try:
+            for product in self._merged_products(request):
+                page.append(product)
+                if len(page) == page_size:
+                    sent += len(page)
+                    next_cursor = product._id if by_id else request.cursor + sent
+                    yield marketplace_pb2.SearchItemPage(products=page, next_cursor=next_cursor, status="SUCCESS")
+                    page = []
+        except grpc.RpcError as error:
+            context.abort(error.code(), error.details())
+        yield marketplace_pb2.SearchItemPage(products=page, next_cursor=0, status="SUCCESS")
+
+    def RateItem(self, request, context):
+        return self._forward(self._owner(request._id).RateItem, request, context)
+
+    def WishlistItem(self, request, context):
+        return self._forward(self._owner(request._id).WishlistItem, request, context)
+
+    def UpdateItem(self, request, context):
+        return self._forward(self._owner(request._id).UpdateItem, request, context)
+
+    def BuyItem(self, request, context):
+        return self._forward(self._owner(request._id).BuyItem, request, context)
+
+    # batch functions
+    def _scatter(self, method, request, context, shard_for):
+        """Splits a batch over the shards by shard_for(position, item) and reassembles the results in order."""
+        positions = [[] for _ in self.stubs]
+        for position, item in enumerate(request.items):
+            positions[shard_for(position, item)].append(position)
+
+        calls = []
+        for shard, shard_positions in enumerate(positions):
+            if not shard_positions:
+                continue
+            shard_request = type(request)()
+            shard_request.CopyFrom(request)
+            del shard_request.items[:]
+            shard_request.items.extend(request.items[position] for position in shard_positions)
+            calls.append((shard_positions, getattr(self.stubs[shard], method).future(shard_request)))
+
+        results = [None] * len(request.items)
+        try:
+            for shard_positions, call in calls:
+                response = call.result()
+                if response.status != "SUCCESS":
+                    return response
+                for position, result in zip(shard_positions, response.results):
+                    results[position] = result
+        except grpc.RpcError as error:
+            context.abort(error.code(), error.details())
+        return marketplace_pb2.BatchResponse(status="SUCCESS", results=results)
+
+    def SellItems(self, request, context):
+        start = next(self._next_shard)
+        return self._scatter('SellItems', request, context,
+                             lambda position, item: (start + position) % len(self.stubs))
+
+    def UpdateItems(self, request, context):
+        return self._scatter('UpdateItems', request, context,
+                             lambda position, item: shard_of(item._id, len(self.stubs)))
+
+    def BuyItems(self, request, context):
+        return self._scatter('BuyItems', request, context,
+                             lambda position, item: shard_of(item._id, len(self.stubs)))
+
+    def Subscribe(self, request, context):
+        # served from the router, so a subscriber holds nothing on the shards
+        yield from self.subscriptions.stream(request, context)
+
+
+def serve_sharded(n_shards, port=50051, base_shard_port=50061, max_workers=MAX_WORKERS, data_dir=None,
+                  log_level='INFO', metrics_port=None, admission=None, lanes=None, max_streams=MAX_STREAMS,
+                  max_concurrent_rpcs=None, dial_back=False):
+    # spawn, not fork: a forked child must not inherit the parent's grpc state
+    mp = multiprocessing.get_context('spawn')
+    shard_ports = [base_shard_port + i for i in range(n_shards)]
+    shards = [mp.Process(target=run_shard, args=(i, n_shards, shard_port, max_workers, data_dir, log_level, lanes,
+                                                 max_streams), daemon=True)
+              for i, shard_port in enumerate(shard_ports)]
+    for shard in shards:
+        shard.start()
+
+    channels = [grpc.insecure_channel(f'localhost:{shard_port}', options=CHANNEL_OPTIONS)
+                for shard_port in shard_ports]
+    for channel in channels:
+        grpc.channel_ready_future(channel).result(timeout=SHARD_READY_TIMEOUT)
+
+    executor = LaneExecutor(with_stream_lane(lanes or {DEFAULT_LANE: max_workers}, max_streams))
+    # the router's metrics time the RPCs end to end, including the fan-out to the shards
+    interceptors = []
+    if metrics_port is not None:
+        metrics = Metrics()
+        metrics.gauge('marketplace_streams_refused', lambda: executor.refused)
+        serve_metrics(metrics, metrics_port)
+        interceptors.append(MetricsInterceptor(metrics))
+        logger.info("Serving metrics on port %s", metrics_port)
+    # limits are applied at the router, the shards only see what it lets through
+    if admission is not None:
+        interceptors.append(AdmissionInterceptor(admission))
+        if metrics_port is not None:
+            metrics.gauge('marketplace_admission_rejected', lambda: admission.rejected)
+    interceptors.insert(0, LaneInterceptor(executor))
+    server = grpc.server(executor, interceptors=interceptors, options=SERVER_OPTIONS,
+                         maximum_concurrent_rpcs=max_concurrent_rpcs)
+    router = ShardRouter(channels, NotificationDispatcher().start() if dial_back else None)
+    marketplace_pb2_grpc.add_MarketplaceServicer_to_server(router.start(), server)
+    server.add_insecure_port(f'[::]:{port}')
+    server.start()
+    logger.info("Routing port %s to %s shards on ports %s", port, n_shards, shard_ports)
+    # let a SIGTERM unwind through the finally below so the shards go down with the router
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stop(0))
+    try:
+        server.wait_for_termination()
+    finally:
+        for shard in shards:
+            shard.terminate()
@@ -0,0 +1,88 @@
+import atexit
+import contextlib
+import logging
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+ROOT_LOGGER = 'marketplace'
+LOG_QUEUE_SIZE = 100000
+
+
+def fields(**kwargs):
+    """Structured fields for a log call: logger.info("...", extra=fields(method='SellItem'))."""
+    return {'fields': kwargs}
+
+
+def format_value(value):
+    # quoted when it would otherwise run into the next key=value
+    value = str(value)
+    if not value or any(c.isspace() or c in '"=' for c in value):
+        return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+    return value
+
+
+class KeyValueFormatter(logging.Formatter):
+    """time level logger message key=value ..., one line per record."""
+
+    def format(self, record):
+        line = '{} {:<7} {} {}'.format(
+            time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)),
+            record.levelname, record.name, record.getMessage())
+        record_fields = getattr(record, 'fields', None)
+        if record_fields:
+            line += ' ' + ' '.join(f'{key}={format_value(value)}' for key, value in record_fields.items())
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """
+    Puts records on the queue as they are. The stock QueueHandler formats the message in
+    the calling thread; here that is left to the listener, the handlers only pass plain
+    values as arguments so nothing changes under it. A full queue drops the record rather
+    than blocking the request.
+    """
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def configure(level='INFO', stream=None):
+    """
+    Sends every 'marketplace.*' logger through a bounded queue to a background thread that
+    formats and writes the records. Returns the listener, stopped again at exit.
+    """
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(KeyValueFormatter())
+    listener = QueueListener(log_queue, output)
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.handlers[:] = [BackgroundQueueHandler(log_queue)]
+    logger.setLevel(level)
+    logger.propagate = False
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+@contextlib.contextmanager
+def quiet(logger_name=ROOT_LOGGER, level=logging.WARNING):
+    """Raises the level of a logger for a while, e.g. while replaying a log of requests."""
+    logger = logging.getLogger(logger_name)
+    previous = logger.level
+    logger.setLevel(level)
+    try:
+        yield
+    finally:
+        logger.setLevel(previous)